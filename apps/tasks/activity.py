@@ -0,0 +1,161 @@
+import atexit
+import logging
+import os
+import threading
+import time
+from datetime import date, datetime
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist
+from django.core.signals import request_finished
+from django.db import connection, models, transaction
+from django.utils import timezone
+
+from .models import TaskActivity
+
+
+logger = logging.getLogger(__name__)
+
+
+def to_json_value(value):
+    """
+    Значение поля в виде, пригодном для JSON: модели заменяются на id, даты - на строки ISO 8601
+    """
+    if isinstance(value, models.Model):
+        return value.pk
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    return str(value)
+
+
+def diff_fields(instance, validated_data):
+    """
+    Изменения полей объекта перед сохранением validated_data: {поле: [старое, новое]}
+    """
+    changes = {}
+    for field, new_value in validated_data.items():
+        try:
+            model_field = instance._meta.get_field(field)
+        except FieldDoesNotExist:
+            model_field = None
+        if model_field is not None and model_field.is_relation:
+            # Для связей сравниваем id, не обращаясь к дескриптору, чтобы не загружать связанный объект
+            old_value = getattr(instance, model_field.attname, None)
+            new_value = new_value.pk if isinstance(new_value, models.Model) else new_value
+        else:
+            old_value = getattr(instance, field, None)
+        if old_value != new_value:
+            changes[field] = [to_json_value(old_value), to_json_value(new_value)]
+    return changes
+
+
+def initial_fields(instance, fields):
+    return {field: [None, to_json_value(getattr(instance, field, None))] for field in fields}
+
+
+class ActivityBuffer:
+    """
+    Буфер событий журнала в памяти процесса. События записываются через bulk_create,
+    когда буфер достигает ACTIVITY_FLUSH_SIZE или самое старое событие старше ACTIVITY_FLUSH_INTERVAL.
+    Срок проверяется при добавлении события, по окончании запроса и фоновым потоком-таймером,
+    поэтому события простаивающего воркера тоже записываются вовремя.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.events = []
+        self.first_added_at = None
+        self.timer_pid = None
+
+    def add(self, event):
+        with self.lock:
+            self.events.append(event)
+            if self.first_added_at is None:
+                self.first_added_at = time.monotonic()
+        self.start_timer()
+        self.flush_if_due()
+
+    def start_timer(self):
+        """
+        Запуск таймера при первом событии процесса. Потоки не переживают fork, поэтому воркер,
+        созданный из предзагруженного главного процесса, запускает собственный таймер.
+        """
+        if not settings.ACTIVITY_FLUSH_TIMER:
+            return
+        pid = os.getpid()
+        with self.lock:
+            if self.timer_pid == pid:
+                return
+            self.timer_pid = pid
+        threading.Thread(target=self.run_timer, name='activity-flush-timer', daemon=True).start()
+
+    def run_timer(self):
+        while True:
+            delay = self.tick()
+            # Соединение потока таймера не держится открытым между записями
+            connection.close()
+            time.sleep(delay)
+
+    def tick(self):
+        """
+        Одна проверка таймера: запись событий, если срок истек. Возвращает время до следующей проверки.
+        """
+        with self.lock:
+            first_added_at = self.first_added_at
+        interval = settings.ACTIVITY_FLUSH_INTERVAL
+        if first_added_at is not None:
+            delay = first_added_at + interval - time.monotonic()
+            if delay > 0:
+                return delay
+            self.flush()
+        return interval
+
+    def is_due(self):
+        if not self.events:
+            return False
+        if len(self.events) >= settings.ACTIVITY_FLUSH_SIZE:
+            return True
+        return time.monotonic() - self.first_added_at >= settings.ACTIVITY_FLUSH_INTERVAL
+
+    def flush_if_due(self, **kwargs):
+        if self.is_due():
+            self.flush()
+
+    def flush(self, **kwargs):
+        with self.lock:
+            events, self.events = self.events, []
+            self.first_added_at = None
+        if not events:
+            return 0
+        try:
+            TaskActivity.objects.bulk_create(events, batch_size=settings.ACTIVITY_FLUSH_SIZE)
+        except Exception:
+            logger.exception('Failed to write %s activity events', len(events))
+            return 0
+        return len(events)
+
+
+activity_buffer = ActivityBuffer()
+
+
+def record_activity(task_id, actor, object_type, object_id, action, changes=None):
+    """
+    Добавление события в журнал. Внутри транзакции событие попадает в буфер только после ее фиксации.
+    """
+    event = TaskActivity(
+        task_id=task_id,
+        actor_id=actor.pk if actor is not None and actor.is_authenticated else None,
+        object_type=object_type,
+        object_id=object_id,
+        action=action,
+        changes=changes or {},
+        created_at=timezone.now(),
+    )
+    transaction.on_commit(lambda: activity_buffer.add(event))
+
+
+def connect_signals():
+    request_finished.connect(activity_buffer.flush_if_due, dispatch_uid='activity_buffer_flush')
+    atexit.register(activity_buffer.flush)
@@ -0,0 +1,98 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Task, Comment, TaskFile, ArchivedTask, ArchivedComment, ArchivedTaskFile
+
+
+def get_archive_cutoff(older_than_days):
+    return timezone.now() - timedelta(days=older_than_days)
+
+
+def get_archive_candidates(cutoff):
+    """
+    Задачи, выполненные раньше момента cutoff. Изменение выполненной задачи не откладывает ее архивацию,
+    повторное выполнение после переоткрытия - откладывает.
+    """
+    return Task.objects.filter(is_completed=True, completed_at__lt=cutoff)
+
+
+def archive_batch(task_ids, cutoff):
+    """
+    Перенос пачки задач вместе с комментариями и файлами в архивные таблицы.
+    Выполняется в отдельной короткой транзакции. После блокировки условие отбора проверяется заново:
+    задача, измененная после выбора кандидатов, остается в основной таблице.
+    """
+    with transaction.atomic():
+        tasks = list(get_archive_candidates(cutoff).select_for_update().filter(id__in=task_ids))
+        if not tasks:
+            return 0
+        ids = [task.id for task in tasks]
+        ArchivedTask.objects.bulk_create([
+            ArchivedTask(
+                id=task.id,
+                title=task.title,
+                description=task.description,
+                created_by_id=task.created_by_id,
+                assigned_to_id=task.assigned_to_id,
+                is_completed=task.is_completed,
+                created_at=task.created_at,
+                updated_at=task.updated_at,
+                deadline=task.deadline,
+                completed_at=task.completed_at,
+                version=task.version,
+            ) for task in tasks
+        ])
+        ArchivedComment.objects.bulk_create([
+            ArchivedComment(
+                id=comment.id,
+                task_id=comment.task_id,
+                author_id=comment.author_id,
+                parent_id=comment.parent_id,
+                content=comment.content,
+                created_at=comment.created_at,
+                path=comment.path,
+                depth=comment.depth,
+            ) for comment in Comment.objects.filter(task_id__in=ids)
+        ])
+        ArchivedTaskFile.objects.bulk_create([
+            ArchivedTaskFile(
+                id=task_file.id,
+                task_id=task_file.task_id,
+                file=task_file.file.name,
+                uploaded_at=task_file.uploaded_at,
+            ) for task_file in TaskFile.objects.filter(task_id__in=ids)
+        ])
+        # Удаление задачи каскадно удаляет комментарии и записи о файлах, сами файлы остаются в хранилище
+        Task.objects.filter(id__in=ids).delete()
+    return len(ids)
+
+
+def archive_completed_tasks(older_than_days=None, batch_size=None, limit=None):
+    """
+    Перенос всех подходящих задач в архив пачками по batch_size.
+    Возвращает количество перенесенных задач.
+    """
+    if older_than_days is None:
+        older_than_days = settings.TASK_ARCHIVE_AFTER_DAYS
+    if batch_size is None:
+        batch_size = settings.TASK_ARCHIVE_BATCH_SIZE
+
+    cutoff = get_archive_cutoff(older_than_days)
+    archived = 0
+    last_id = 0
+    while limit is None or archived < limit:
+        size = batch_size if limit is None else min(batch_size, limit - archived)
+        ids = list(
+            get_archive_candidates(cutoff)
+            .filter(id__gt=last_id)
+            .order_by('id')
+            .values_list('id', flat=True)[:size]
+        )
+        if not ids:
+            break
+        last_id = ids[-1]
+        archived += archive_batch(ids, cutoff)
+    return archived
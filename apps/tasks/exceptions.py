@@ -0,0 +1,11 @@
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+
+class PreconditionFailed(APIException):
+    """
+    Задача была изменена другим запросом после того, как клиент получил ее версию
+    """
+    status_code = status.HTTP_412_PRECONDITION_FAILED
+    default_detail = 'Task was modified by another request. Reload it and retry.'
+    default_code = 'precondition_failed'
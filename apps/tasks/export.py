@@ -0,0 +1,117 @@
+import csv
+import json
+
+from django.conf import settings
+from django.db.models import Prefetch
+
+from .models import Comment
+from .renderers import orjson
+
+
+EXPORT_FORMATS = ('ndjson', 'csv')
+
+CSV_COLUMNS = ['record', 'id', 'task_id', 'title', 'description', 'created_by', 'assigned_to', 'is_completed',
+               'created_at', 'updated_at', 'deadline', 'author', 'parent', 'content', 'file', 'uploaded_at']
+
+
+class Echo:
+    """
+    Псевдо-буфер для csv.writer: возвращает строку вместо записи, чтобы отдавать ее в поток
+    """
+
+    def write(self, value):
+        return value
+
+
+def format_datetime(value):
+    return value.isoformat() if value is not None else None
+
+
+def username(user):
+    return user.username if user is not None else None
+
+
+def iter_tasks(queryset, chunk_size=None):
+    """
+    Обход задач серверным курсором пачками по chunk_size с подгрузкой комментариев и файлов для каждой пачки
+    """
+    if chunk_size is None:
+        chunk_size = settings.TASK_EXPORT_CHUNK_SIZE
+    queryset = queryset.select_related('created_by', 'assigned_to').prefetch_related(
+        Prefetch('comments', queryset=Comment.objects.select_related('author').order_by('id')),
+        'files',
+    )
+    return queryset.iterator(chunk_size=chunk_size)
+
+
+def task_to_dict(task):
+    return {
+        'id': task.id,
+        'title': task.title,
+        'description': task.description,
+        'created_by': username(task.created_by),
+        'assigned_to': username(task.assigned_to),
+        'is_completed': task.is_completed,
+        'created_at': format_datetime(task.created_at),
+        'updated_at': format_datetime(task.updated_at),
+        'deadline': format_datetime(task.deadline),
+        'comments': [
+            {
+                'id': comment.id,
+                'author': username(comment.author),
+                'parent': comment.parent_id,
+                'content': comment.content,
+                'created_at': format_datetime(comment.created_at),
+            }
+            for comment in task.comments.all()
+        ],
+        'files': [
+            {
+                'id': task_file.id,
+                'file': task_file.file.name,
+                'uploaded_at': format_datetime(task_file.uploaded_at),
+            }
+            for task_file in task.files.all()
+        ],
+    }
+
+
+def iter_ndjson(queryset, chunk_size=None):
+    """
+    Выгрузка задач в формате NDJSON: одна задача с комментариями и файлами на строку
+    """
+    for task in iter_tasks(queryset, chunk_size):
+        if orjson is not None:
+            yield orjson.dumps(task_to_dict(task)) + b'\n'
+        else:
+            yield json.dumps(task_to_dict(task), ensure_ascii=False).encode() + b'\n'
+
+
+def iter_csv(queryset, chunk_size=None):
+    """
+    Выгрузка задач в формате CSV. Комментарии и файлы идут отдельными строками после своей задачи,
+    тип строки указан в колонке record.
+    """
+    writer = csv.DictWriter(Echo(), fieldnames=CSV_COLUMNS)
+    yield writer.writeheader()
+    for task in iter_tasks(queryset, chunk_size):
+        data = task_to_dict(task)
+        comments = data.pop('comments')
+        files = data.pop('files')
+        yield writer.writerow({'record': 'task', 'task_id': data['id'], **data})
+        for comment in comments:
+            yield writer.writerow({'record': 'comment', 'task_id': data['id'], **comment})
+        for task_file in files:
+            yield writer.writerow({'record': 'file', 'task_id': data['id'], **task_file})
+
+
+def iter_export(queryset, export_format, chunk_size=None):
+    if export_format == 'csv':
+        return iter_csv(queryset, chunk_size)
+    return iter_ndjson(queryset, chunk_size)
+
+
+def get_content_type(export_format):
+    if export_format == 'csv':
+        return 'text/csv; charset=utf-8'
+    return 'application/x-ndjson'
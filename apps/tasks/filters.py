@@ -1,15 +1,40 @@
+from django.conf import settings
 from django_filters import rest_framework as filters
-from .models import Task
+from rest_framework.exceptions import ValidationError
+from .models import Task, ArchivedTask
+
+
+class NumberInFilter(filters.BaseInFilter, filters.NumberFilter):
+    pass
 
 
 class TaskFilter(filters.FilterSet):
     """
     Фильтрация задач по основным параметрам
     """
+    ids = NumberInFilter(field_name='id', method='filter_ids')
     is_completed = filters.BooleanFilter(field_name='is_completed')
     assigned_to = filters.CharFilter(field_name='assigned_to__username')
     deadline = filters.DateFromToRangeFilter(field_name='deadline')
 
     class Meta:
         model = Task
-        fields = ['is_completed', 'assigned_to', 'deadline']
+        fields = ['ids', 'is_completed', 'assigned_to', 'deadline']
+
+    def filter_ids(self, queryset, name, value):
+        """
+        Получение нескольких задач по списку id: ?ids=1,2,3
+        """
+        if len(value) > settings.TASK_MULTI_GET_MAX_IDS:
+            raise ValidationError({'ids': f'No more than {settings.TASK_MULTI_GET_MAX_IDS} ids are allowed.'})
+        return queryset.filter(id__in=value)
+
+
+class ArchivedTaskFilter(TaskFilter):
+    """
+    Те же фильтры для архивных задач
+    """
+
+    class Meta:
+        model = ArchivedTask
+        fields = ['ids', 'is_completed', 'assigned_to', 'deadline']
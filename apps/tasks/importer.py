@@ -0,0 +1,283 @@
+import csv
+import json
+import os
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.utils import timezone
+from rest_framework import serializers
+
+from .models import Task, Comment, make_path
+from .rollups import record_task_changes, task_state
+
+
+IMPORT_FORMATS = ('ndjson', 'csv')
+
+TRUE_VALUES = ('1', 'true', 'yes')
+FALSE_VALUES = ('', '0', 'false', 'no')
+
+
+class InvalidRecord:
+    """
+    Строка файла, которую не удалось прочитать. Попадает в ошибки импорта как обычная неверная запись.
+    """
+
+    def __init__(self, error):
+        self.error = error
+
+
+def iter_ndjson_records(lines):
+    """
+    Чтение задач из NDJSON: одна задача с вложенным списком comments на строку
+    """
+    for line in lines:
+        if isinstance(line, bytes):
+            try:
+                line = line.decode()
+            except UnicodeDecodeError:
+                yield InvalidRecord('Line is not valid UTF-8.')
+                continue
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError as exc:
+            yield InvalidRecord(f'Invalid JSON: {exc}')
+
+
+def iter_csv_records(lines):
+    """
+    Чтение задач из CSV в формате выгрузки: строки комментариев идут после своей задачи.
+    Нарушенная структура файла прерывает импорт с ValueError: дальнейшие строки нельзя надежно разделить на поля.
+    """
+    # Длинные описания из старых систем не помещаются в стандартный лимит поля 128 КБ
+    csv.field_size_limit(max(csv.field_size_limit(), settings.TASK_IMPORT_CSV_FIELD_SIZE_LIMIT))
+    reader = csv.DictReader(lines)
+    task = None
+    while True:
+        try:
+            row = next(reader)
+        except StopIteration:
+            break
+        except csv.Error as exc:
+            raise ValueError(f'Invalid CSV at line {reader.line_num}: {exc}')
+        record = row.get('record') or 'task'
+        if record == 'task':
+            if task is not None:
+                yield task
+            task = dict(row, comments=[])
+        elif record == 'comment' and task is not None:
+            task['comments'].append(row)
+    if task is not None:
+        yield task
+
+
+def iter_records(lines, import_format):
+    if import_format == 'csv':
+        return iter_csv_records(lines)
+    return iter_ndjson_records(lines)
+
+
+class TaskImporter:
+    """
+    Пакетный импорт задач с комментариями.
+    Пользователи загружаются одним запросом, записи проверяются и сохраняются через bulk_create
+    пачками по batch_size в отдельных транзакциях. После каждой пачки сохраняется контрольная точка,
+    поэтому прерванный импорт продолжается с места остановки.
+    """
+    datetime_field = serializers.DateTimeField()
+
+    def __init__(self, batch_size=None, checkpoint_path=None, default_created_by=None, progress=None):
+        self.batch_size = batch_size or settings.TASK_IMPORT_BATCH_SIZE
+        self.checkpoint_path = checkpoint_path
+        self.default_created_by = default_created_by
+        self.progress = progress
+        self.user_ids = dict(User.objects.values_list('username', 'id'))
+        self.imported_tasks = 0
+        self.imported_comments = 0
+        self.errors = []
+        # Номер записи, до которой импорт сохранен: с него продолжается импорт после сбоя
+        self.processed = 0
+
+    def read_checkpoint(self):
+        if not self.checkpoint_path or not os.path.exists(self.checkpoint_path):
+            return 0
+        with open(self.checkpoint_path) as checkpoint:
+            return json.load(checkpoint)['processed']
+
+    def write_checkpoint(self, processed):
+        if not self.checkpoint_path:
+            return
+        tmp_path = f'{self.checkpoint_path}.tmp'
+        with open(tmp_path, 'w') as checkpoint:
+            json.dump({'processed': processed}, checkpoint)
+        os.replace(tmp_path, self.checkpoint_path)
+
+    def parse_string(self, value, errors, field):
+        """
+        Строковое поле записи: NDJSON может содержать в нем число, список или объект
+        """
+        if value is None:
+            return ''
+        if not isinstance(value, str):
+            errors[field] = 'Not a valid string.'
+            return ''
+        return value
+
+    def resolve_user(self, username, required, errors, field):
+        username = self.parse_string(username, errors, field).strip()
+        if field in errors:
+            return None
+        if not username:
+            if required:
+                errors[field] = 'This field is required.'
+            return None
+        user_id = self.user_ids.get(username)
+        if user_id is None:
+            errors[field] = f'User "{username}" does not exist.'
+        return user_id
+
+    def parse_datetime(self, value, errors, field):
+        if not value:
+            return None
+        try:
+            return self.datetime_field.to_internal_value(value)
+        except serializers.ValidationError as exc:
+            errors[field] = exc.detail[0]
+            return None
+
+    def parse_bool(self, value, errors, field):
+        if isinstance(value, bool):
+            return value
+        value = str(value or '').strip().lower()
+        if value in TRUE_VALUES:
+            return True
+        if value not in FALSE_VALUES:
+            errors[field] = f'"{value}" is not a valid boolean.'
+        return False
+
+    def build_task(self, record):
+        """
+        Проверка записи и создание несохраненных объектов задачи и комментариев
+        """
+        if isinstance(record, InvalidRecord):
+            return None, [], {'record': record.error}
+        if not isinstance(record, dict):
+            return None, [], {'record': 'Expected an object.'}
+        errors = {}
+        title = self.parse_string(record.get('title'), errors, 'title').strip()
+        if not title and 'title' not in errors:
+            errors['title'] = 'This field is required.'
+        elif len(title) > Task._meta.get_field('title').max_length:
+            errors['title'] = 'Ensure this field has no more than 255 characters.'
+        created_by = record.get('created_by') or self.default_created_by
+        task = Task(
+            title=title,
+            description=self.parse_string(record.get('description'), errors, 'description') or None,
+            created_by_id=self.resolve_user(created_by, True, errors, 'created_by'),
+            assigned_to_id=self.resolve_user(record.get('assigned_to'), False, errors, 'assigned_to'),
+            is_completed=self.parse_bool(record.get('is_completed'), errors, 'is_completed'),
+            deadline=self.parse_datetime(record.get('deadline'), errors, 'deadline'),
+        )
+        comments = []
+        items = record.get('comments') or []
+        if not isinstance(items, list):
+            errors['comments'] = 'Expected a list of objects.'
+            items = []
+        for index, item in enumerate(items):
+            if not isinstance(item, dict):
+                errors[f'comments[{index}]'] = 'Expected an object.'
+                continue
+            comment_errors = {}
+            content = self.parse_string(item.get('content'), comment_errors, 'content')
+            if not content and 'content' not in comment_errors:
+                comment_errors['content'] = 'This field is required.'
+            author_id = self.resolve_user(item.get('author'), True, comment_errors, 'author')
+            if comment_errors:
+                errors[f'comments[{index}]'] = comment_errors
+            comment = Comment(author_id=author_id, content=content)
+            # id из источника нужны только для восстановления веток ответов
+            comment.source_id = str(item.get('id') or '')
+            comment.source_parent = str(item.get('parent') or '')
+            comments.append(comment)
+        return task, comments, errors
+
+    def build_threads(self, batch):
+        """
+        Восстановление ответов и материализованных путей после вставки, когда id комментариев известны.
+        Глубина ограничивается COMMENT_MAX_DEPTH, как и при создании комментария через API.
+        """
+        for task, task_comments in batch:
+            by_source_id = {}
+            for comment in task_comments:
+                parent = by_source_id.get(comment.source_parent)
+                if parent is not None and parent.depth + 1 > settings.COMMENT_MAX_DEPTH:
+                    # Ответы глубже COMMENT_MAX_DEPTH становятся ответами на родителя на последнем уровне
+                    parent = parent.parent
+                comment.parent = parent
+                comment.depth = parent.depth + 1 if parent is not None else 0
+                comment.path = make_path(parent.path if parent is not None else '', comment.id)
+                if comment.source_id:
+                    by_source_id[comment.source_id] = comment
+
+    def save_batch(self, batch):
+        now = timezone.now()
+        for task, task_comments in batch:
+            if task.is_completed:
+                task.completed_at = now
+        with transaction.atomic():
+            # bulk_create проставляет первичные ключи в переданные объекты
+            tasks = Task.objects.bulk_create([task for task, task_comments in batch])
+            record_task_changes([(None, task_state(task)) for task in tasks])
+            comments = []
+            for task, task_comments in batch:
+                for comment in task_comments:
+                    comment.task_id = task.id
+                    comments.append(comment)
+            Comment.objects.bulk_create(comments)
+            self.build_threads(batch)
+            Comment.objects.bulk_update(comments, ['parent', 'path', 'depth'])
+        self.imported_tasks += len(tasks)
+        self.imported_comments += len(comments)
+
+    def run(self, records, start=None):
+        """
+        Импорт записей, начиная с позиции start (по умолчанию - с контрольной точки).
+        Возвращает сводку по результатам.
+        """
+        processed = self.read_checkpoint() if start is None else start
+        self.processed = processed
+        batch = []
+        batch_end = processed
+        for position, record in enumerate(records):
+            if position < processed:
+                continue
+            batch_end = position + 1
+            task, comments, errors = self.build_task(record)
+            if errors:
+                self.errors.append({'record': position, 'errors': errors})
+            else:
+                batch.append((task, comments))
+            if batch_end - processed >= self.batch_size:
+                self.flush(batch, batch_end)
+                batch = []
+                processed = batch_end
+        if batch_end > processed:
+            self.flush(batch, batch_end)
+            processed = batch_end
+        return {
+            'processed': processed,
+            'imported_tasks': self.imported_tasks,
+            'imported_comments': self.imported_comments,
+            'errors': self.errors,
+        }
+
+    def flush(self, batch, processed):
+        if batch:
+            self.save_batch(batch)
+        self.processed = processed
+        self.write_checkpoint(processed)
+        if self.progress is not None:
+            self.progress(processed, self.imported_tasks, len(self.errors))
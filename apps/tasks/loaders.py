@@ -0,0 +1,89 @@
+from django.contrib.auth.models import User
+from django.db.models import Q
+
+
+def to_user_id(value):
+    """
+    id пользователя из значения запроса. Логические значения и дробные числа не принимаются,
+    хотя int() и преобразует их без ошибки.
+    """
+    if isinstance(value, bool) or (isinstance(value, float) and not value.is_integer()):
+        raise TypeError(f'Invalid user id: {value!r}')
+    return int(value)
+
+
+class UserLoader:
+    """
+    Загрузка пользователей на время запроса в стиле DataLoader: все id и имена пользователей,
+    которые встретятся в запросе, регистрируются заранее и загружаются одним запросом к базе.
+    """
+
+    def __init__(self, users=()):
+        self.by_id = {}
+        self.by_username = {}
+        self.pending_ids = set()
+        self.pending_usernames = set()
+        for user in users:
+            self.add(user)
+
+    def add(self, user):
+        self.by_id[user.pk] = user
+        self.by_username[user.username] = user
+
+    def prime(self, ids=(), usernames=()):
+        """
+        Регистрация ключей, которые понадобятся позже
+        """
+        for user_id in ids:
+            try:
+                user_id = to_user_id(user_id)
+            except (TypeError, ValueError):
+                continue
+            if user_id not in self.by_id:
+                self.pending_ids.add(user_id)
+        for username in usernames:
+            if isinstance(username, str) and username not in self.by_username:
+                self.pending_usernames.add(username)
+
+    def load(self):
+        """
+        Загрузка всех зарегистрированных ключей одним запросом
+        """
+        if not self.pending_ids and not self.pending_usernames:
+            return
+        for user in User.objects.filter(Q(pk__in=self.pending_ids) | Q(username__in=self.pending_usernames)):
+            self.add(user)
+        # Отсутствующие ключи запоминаются, чтобы не искать их повторно
+        for user_id in self.pending_ids:
+            self.by_id.setdefault(user_id, None)
+        for username in self.pending_usernames:
+            self.by_username.setdefault(username, None)
+        self.pending_ids.clear()
+        self.pending_usernames.clear()
+
+    def get_by_id(self, user_id):
+        user_id = to_user_id(user_id)
+        if user_id not in self.by_id:
+            self.prime(ids=[user_id])
+            self.load()
+        return self.by_id[user_id]
+
+    def get_by_username(self, username):
+        if username not in self.by_username:
+            self.prime(usernames=[username])
+            self.load()
+        return self.by_username[username]
+
+
+def collect_values(data, field):
+    """
+    Значения поля из тела запроса: одного объекта или списка объектов
+    """
+    items = data if isinstance(data, list) else [data]
+    values = []
+    for item in items:
+        if hasattr(item, 'getlist'):
+            values.extend(item.getlist(field))
+        elif isinstance(item, dict) and item.get(field) is not None:
+            values.append(item[field])
+    return values
@@ -0,0 +1,27 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from apps.tasks.archive import archive_completed_tasks
+
+
+class Command(BaseCommand):
+    """
+    Перенос давно выполненных задач в архивные таблицы
+    """
+    help = 'Переносит выполненные задачи старше N дней в архив пачками'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=settings.TASK_ARCHIVE_AFTER_DAYS,
+                            help='Сколько дней задача должна быть выполнена до переноса в архив')
+        parser.add_argument('--batch-size', type=int, default=settings.TASK_ARCHIVE_BATCH_SIZE,
+                            help='Количество задач, переносимых в одной транзакции')
+        parser.add_argument('--limit', type=int, default=None,
+                            help='Максимальное количество задач за один запуск')
+
+    def handle(self, *args, **options):
+        archived = archive_completed_tasks(
+            older_than_days=options['days'],
+            batch_size=options['batch_size'],
+            limit=options['limit'],
+        )
+        self.stdout.write(self.style.SUCCESS(f'Archived {archived} tasks'))
@@ -0,0 +1,25 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from apps.tasks.rollups import compact_rollups, rebuild_rollups
+
+
+class Command(BaseCommand):
+    """
+    Полный пересчет или свертка агрегатов статистики по задачам
+    """
+    help = 'Пересчитывает дневные агрегаты статистики по основной и архивной таблицам задач'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=settings.TASK_STATS_BATCH_SIZE,
+                            help='Количество строк, читаемых из базы за один раз')
+        parser.add_argument('--compact', action='store_true',
+                            help='Только свернуть строки-дельты агрегатов без пересчета по задачам')
+
+    def handle(self, *args, **options):
+        if options['compact']:
+            before, after = compact_rollups(chunk_size=options['batch_size'])
+            self.stdout.write(self.style.SUCCESS(f'Compacted task stats from {before} to {after} rows'))
+            return
+        keys = rebuild_rollups(chunk_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt task stats for {keys} day/assignee pairs'))
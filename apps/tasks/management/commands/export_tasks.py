@@ -0,0 +1,55 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.tasks.export import EXPORT_FORMATS, iter_export
+from apps.tasks.filters import TaskFilter
+from apps.tasks.models import Task
+
+
+class Command(BaseCommand):
+    """
+    Потоковая выгрузка задач с комментариями и файлами для отчетов
+    """
+    help = 'Выгружает задачи в NDJSON или CSV, поддерживает параметры фильтрации TaskFilter'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', dest='export_format', choices=EXPORT_FORMATS, default='ndjson')
+        parser.add_argument('--output', default='-', help='Путь к файлу, по умолчанию stdout')
+        parser.add_argument('--chunk-size', type=int, default=None,
+                            help='Размер пачки серверного курсора')
+        parser.add_argument('--is-completed', choices=['true', 'false'], default=None)
+        parser.add_argument('--assigned-to', default=None, help='Имя пользователя исполнителя')
+        parser.add_argument('--deadline-after', default=None)
+        parser.add_argument('--deadline-before', default=None)
+        parser.add_argument('--user', default=None,
+                            help='Выгрузить только задачи, видимые этому пользователю')
+
+    def get_queryset(self, options):
+        data = {
+            'is_completed': options['is_completed'],
+            'assigned_to': options['assigned_to'],
+            'deadline_after': options['deadline_after'],
+            'deadline_before': options['deadline_before'],
+        }
+        queryset = Task.objects.order_by('id')
+        if options['user']:
+            try:
+                queryset = queryset.visible_to(User.objects.get(username=options['user']))
+            except User.DoesNotExist:
+                raise CommandError(f'User "{options["user"]}" does not exist')
+        filterset = TaskFilter({key: value for key, value in data.items() if value is not None},
+                               queryset=queryset)
+        if not filterset.is_valid():
+            raise CommandError(filterset.errors.as_text())
+        return filterset.qs
+
+    def handle(self, *args, **options):
+        queryset = self.get_queryset(options)
+        chunks = iter_export(queryset, options['export_format'], options['chunk_size'])
+        if options['output'] == '-':
+            for chunk in chunks:
+                self.stdout.write(chunk.decode() if isinstance(chunk, bytes) else chunk, ending='')
+            return
+        with open(options['output'], 'wb') as stream:
+            for chunk in chunks:
+                stream.write(chunk if isinstance(chunk, bytes) else chunk.encode())
@@ -0,0 +1,19 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from smarteducation.docs import write_schema
+
+
+class Command(BaseCommand):
+    """
+    Генерация схемы OpenAPI при сборке или деплое
+    """
+    help = 'Генерирует схему OpenAPI и ее сжатую копию для отдачи по /swagger.json'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', default=settings.API_SCHEMA_FILE,
+                            help='Путь к файлу схемы, рядом сохраняется <output>.gz')
+
+    def handle(self, *args, **options):
+        content = write_schema(options['output'])
+        self.stdout.write(self.style.SUCCESS(f'Schema written to {options["output"]} ({len(content)} bytes)'))
@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.tasks.importer import IMPORT_FORMATS, TaskImporter, iter_records
+
+
+class Command(BaseCommand):
+    """
+    Пакетный импорт задач с комментариями из NDJSON или CSV
+    """
+    help = 'Импортирует задачи с комментариями пачками, поддерживает продолжение с контрольной точки'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Путь к файлу для импорта')
+        parser.add_argument('--format', dest='import_format', choices=IMPORT_FORMATS, default=None,
+                            help='Формат файла, по умолчанию определяется по расширению')
+        parser.add_argument('--batch-size', type=int, default=None,
+                            help='Количество задач в одной транзакции')
+        parser.add_argument('--checkpoint', default=None,
+                            help='Файл контрольной точки, по умолчанию <path>.checkpoint')
+        parser.add_argument('--created-by', default=None,
+                            help='Автор для записей без created_by')
+
+    def progress(self, processed, imported, errors):
+        self.stdout.write(f'Processed {processed} records, imported {imported} tasks, {errors} errors')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        import_format = options['import_format'] or ('csv' if path.endswith('.csv') else 'ndjson')
+        importer = TaskImporter(
+            batch_size=options['batch_size'],
+            checkpoint_path=options['checkpoint'] or f'{path}.checkpoint',
+            default_created_by=options['created_by'],
+            progress=self.progress,
+        )
+        try:
+            with open(path, newline='', encoding='utf-8') as stream:
+                result = importer.run(iter_records(stream, import_format))
+        except (OSError, ValueError) as exc:
+            # Контрольная точка сохранена, повторный запуск продолжит импорт с processed
+            raise CommandError(f'{exc} (processed {importer.processed} records)')
+        for error in result['errors']:
+            self.stderr.write(f'Record {error["record"]}: {error["errors"]}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {result["imported_tasks"]} tasks and {result["imported_comments"]} comments'
+        ))
@@ -0,0 +1,35 @@
+import signal
+
+from django.core.management.base import BaseCommand
+
+from apps.tasks.scheduler import DeadlineScheduler
+
+
+class Command(BaseCommand):
+    """
+    Процесс планировщика дедлайнов: напоминания и события о просрочке задач
+    """
+    help = 'Запускает планировщик дедлайнов задач'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true',
+                            help='Обработать наступившие события один раз и завершиться')
+
+    def handle(self, *args, **options):
+        scheduler = DeadlineScheduler()
+        if options['once']:
+            fired = scheduler.run_pending()
+            self.stdout.write(self.style.SUCCESS(
+                f'Sent {fired.get("reminder", 0)} reminders and {fired.get("overdue", 0)} overdue events'
+            ))
+            return
+        scheduler.connect()
+        signal.signal(signal.SIGTERM, lambda signum, frame: scheduler.stop())
+        self.stdout.write('Deadline scheduler started')
+        try:
+            scheduler.run_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            scheduler.disconnect()
+        self.stdout.write('Deadline scheduler stopped')
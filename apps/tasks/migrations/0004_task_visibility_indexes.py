@@ -0,0 +1,29 @@
+# Generated by Django 4.2.16 on 2026-10-19 16:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0003_archive'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='archivedtask',
+            index=models.Index(fields=['created_by', 'deadline'], name='archived_created_deadline_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedtask',
+            index=models.Index(fields=['assigned_to', 'deadline'], name='archived_assigned_deadline_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['created_by', 'deadline'], name='task_created_by_deadline_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['assigned_to', 'deadline'], name='task_assigned_deadline_idx'),
+        ),
+    ]
@@ -0,0 +1,63 @@
+# Generated by Django 4.2.16 on 2026-10-19 16:41
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_comment_paths(apps, schema_editor):
+    # Существующие комментарии становятся ветками верхнего уровня
+    for model_name in ('Comment', 'ArchivedComment'):
+        model = apps.get_model('tasks', model_name)
+        comments = list(model.objects.only('id'))
+        for comment in comments:
+            comment.path = str(comment.id).zfill(10)
+        model.objects.bulk_update(comments, ['path'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0005_task_deadline_notifications'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='archivedcomment',
+            name='depth',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='archivedcomment',
+            name='parent_id',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='archivedcomment',
+            name='path',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='depth',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='parent',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='replies', to='tasks.comment'),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='path',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['task', 'path'], name='comment_task_path_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['task', 'depth', 'path'], name='comment_task_depth_path_idx'),
+        ),
+        migrations.RunPython(fill_comment_paths, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 4.2.16 on 2026-10-19 16:45
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0006_comment_threads'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TaskActivity',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('task_id', models.BigIntegerField()),
+                ('actor_id', models.BigIntegerField(blank=True, null=True)),
+                ('object_type', models.PositiveSmallIntegerField(choices=[(1, 'task'), (2, 'comment'), (3, 'file')])),
+                ('object_id', models.BigIntegerField()),
+                ('action', models.PositiveSmallIntegerField(choices=[(1, 'created'), (2, 'updated'), (3, 'deleted')])),
+                ('changes', models.JSONField(blank=True, default=dict)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['task_id', '-id'], name='activity_task_id_idx')],
+            },
+        ),
+    ]
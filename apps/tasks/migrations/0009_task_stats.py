@@ -0,0 +1,60 @@
+# Generated by Django 4.2.16 on 2026-10-19 16:52
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def fill_completed_at(apps, schema_editor):
+    # Для уже выполненных задач точное время выполнения неизвестно, берется время последнего изменения
+    for model_name in ('Task', 'ArchivedTask'):
+        model = apps.get_model('tasks', model_name)
+        model.objects.filter(is_completed=True, completed_at__isnull=True).update(completed_at=F('updated_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0008_task_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='archivedtask',
+            name='completed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='task',
+            name='completed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='TaskLatencyBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('assignee_id', models.BigIntegerField(blank=True, null=True)),
+                ('bucket', models.PositiveSmallIntegerField()),
+                ('count', models.IntegerField(default=0)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['day', 'assignee_id', 'bucket'], name='latency_day_assignee_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='TaskDailyStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('assignee_id', models.BigIntegerField(blank=True, null=True)),
+                ('created', models.IntegerField(default=0)),
+                ('completed', models.IntegerField(default=0)),
+                ('completed_late', models.IntegerField(default=0)),
+                ('completion_seconds', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['day', 'assignee_id'], name='stats_day_assignee_idx')],
+            },
+        ),
+        migrations.RunPython(fill_completed_at, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 4.2.16 on 2026-10-19 17:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0010_task_updated_index'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='task',
+            name='task_completed_updated_idx',
+        ),
+        migrations.AddField(
+            model_name='archivedtask',
+            name='version',
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['is_completed', 'completed_at'], name='task_completed_at_idx'),
+        ),
+    ]
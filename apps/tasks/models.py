@@ -1,7 +1,29 @@
 from django.db import models
+from django.utils import timezone
 from django.contrib.auth.models import User
 
 
+def visibility_q(user, prefix=''):
+    """
+    Условие видимости задачи: пользователь является ее автором или исполнителем.
+    Сравнение идет по столбцам *_id без загрузки связанных пользователей.
+    """
+    return models.Q(**{f'{prefix}created_by_id': user.id}) | models.Q(**{f'{prefix}assigned_to_id': user.id})
+
+
+class TaskQuerySet(models.QuerySet):
+
+    def visible_to(self, user):
+        return self.filter(visibility_q(user))
+
+    def with_related(self):
+        """
+        План загрузки связанных данных для TaskSerializer: пользователи одним JOIN,
+        комментарии и файлы - по одному запросу на весь набор задач
+        """
+        return self.select_related('created_by', 'assigned_to').prefetch_related('comments__author', 'files')
+
+
 class Task(models.Model):
     """
     модель для задач
@@ -15,23 +37,97 @@ class Task(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     deadline = models.DateTimeField(null=True, blank=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+    reminder_sent_at = models.DateTimeField(null=True, blank=True)
+    overdue_notified_at = models.DateTimeField(null=True, blank=True)
+    # Версия для оптимистичной блокировки: увеличивается при каждом изменении через API
+    version = models.PositiveIntegerField(default=1)
+
+    objects = TaskQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Очередь дедлайнов планировщика: только открытые задачи, по которым еще не было уведомления
+            models.Index(fields=['deadline'], name='task_open_deadline_idx',
+                         condition=models.Q(is_completed=False, overdue_notified_at__isnull=True)),
+            # Поиск давно выполненных задач для переноса в архив
+            models.Index(fields=['is_completed', 'completed_at'], name='task_completed_at_idx'),
+            # Дочитывание измененных задач планировщиком дедлайнов
+            models.Index(fields=['updated_at'], name='task_updated_idx'),
+            # Условие видимости created_by OR assigned_to раскладывается на два индексных поиска
+            # с уже упорядоченным по дедлайну результатом
+            models.Index(fields=['created_by', 'deadline'], name='task_created_by_deadline_idx'),
+            models.Index(fields=['assigned_to', 'deadline'], name='task_assigned_deadline_idx'),
+        ]
 
     def __str__(self):
         return self.title
 
 
+PATH_SEGMENT_WIDTH = 10
+PATH_SEPARATOR = '.'
+# Следующий за разделителем символ: все потомки узла лежат в диапазоне [path, path + PATH_UPPER_BOUND)
+PATH_UPPER_BOUND = '/'
+
+
+def make_path(parent_path, comment_id):
+    """
+    Материализованный путь комментария: id предков и самого комментария фиксированной ширины через точку.
+    Сортировка по пути дает порядок отображения ветки.
+    """
+    segment = str(comment_id).zfill(PATH_SEGMENT_WIDTH)
+    return f'{parent_path}{PATH_SEPARATOR}{segment}' if parent_path else segment
+
+
+class CommentQuerySet(models.QuerySet):
+
+    def subtree(self, comment, max_depth=None):
+        """
+        Комментарий и все его ответы одним диапазонным запросом по индексу (task, path)
+        """
+        return self.path_range(comment.task_id, comment.path, comment.path, max_depth)
+
+    def path_range(self, task_id, first_path, last_path, max_depth=None):
+        queryset = self.filter(task_id=task_id, path__gte=first_path, path__lt=last_path + PATH_UPPER_BOUND)
+        if max_depth is not None:
+            queryset = queryset.filter(depth__lte=max_depth)
+        return queryset.order_by('path')
+
+
 class Comment(models.Model):
     """
     модель для комментариев
     """
     task = models.ForeignKey(Task, related_name='comments', on_delete=models.CASCADE)
     author = models.ForeignKey(User, on_delete=models.CASCADE)
+    parent = models.ForeignKey('self', related_name='replies', on_delete=models.CASCADE, null=True, blank=True)
     content = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
+    path = models.CharField(max_length=255, blank=True, default='')
+    depth = models.PositiveSmallIntegerField(default=0)
+
+    objects = CommentQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Загрузка ветки или поддерева одним диапазонным запросом
+            models.Index(fields=['task', 'path'], name='comment_task_path_idx'),
+            # Постраничный вывод веток верхнего уровня
+            models.Index(fields=['task', 'depth', 'path'], name='comment_task_depth_path_idx'),
+        ]
 
     def __str__(self):
         return f'Comment by {self.author.username} on {self.task.title}'
 
+    def save(self, *args, **kwargs):
+        is_new = self.pk is None
+        super().save(*args, **kwargs)
+        if is_new:
+            # Путь содержит собственный id, поэтому заполняется сразу после вставки
+            self.depth = self.parent.depth + 1 if self.parent_id else 0
+            self.path = make_path(self.parent.path if self.parent_id else '', self.pk)
+            Comment.objects.filter(pk=self.pk).update(path=self.path, depth=self.depth)
+
 
 class TaskFile(models.Model):
     """
@@ -43,3 +139,142 @@ class TaskFile(models.Model):
 
     def __str__(self):
         return f'{self.file.name}'
+
+
+class ArchivedTask(models.Model):
+    """
+    Архивная копия выполненной задачи, перенесенной из основной таблицы
+    """
+    id = models.BigIntegerField(primary_key=True)
+    title = models.CharField(max_length=255)
+    description = models.TextField(blank=True, null=True)
+    created_by = models.ForeignKey(User, related_name='created_archived_tasks', on_delete=models.CASCADE)
+    assigned_to = models.ForeignKey(User, related_name='assigned_archived_tasks', on_delete=models.SET_NULL,
+                                    null=True, blank=True)
+    is_completed = models.BooleanField(default=True)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    deadline = models.DateTimeField(null=True, blank=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+    version = models.PositiveIntegerField(default=1)
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    objects = TaskQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_by', 'deadline'], name='archived_created_deadline_idx'),
+            models.Index(fields=['assigned_to', 'deadline'], name='archived_assigned_deadline_idx'),
+        ]
+
+    def __str__(self):
+        return self.title
+
+
+class ArchivedComment(models.Model):
+    """
+    Комментарий архивной задачи
+    """
+    id = models.BigIntegerField(primary_key=True)
+    task = models.ForeignKey(ArchivedTask, related_name='comments', on_delete=models.CASCADE)
+    author = models.ForeignKey(User, related_name='+', on_delete=models.CASCADE)
+    parent_id = models.BigIntegerField(null=True, blank=True)
+    content = models.TextField()
+    created_at = models.DateTimeField()
+    path = models.CharField(max_length=255, blank=True, default='')
+    depth = models.PositiveSmallIntegerField(default=0)
+
+    def __str__(self):
+        return f'Comment by {self.author.username} on {self.task.title}'
+
+
+class ArchivedTaskFile(models.Model):
+    """
+    Файл архивной задачи
+    """
+    id = models.BigIntegerField(primary_key=True)
+    task = models.ForeignKey(ArchivedTask, related_name='files', on_delete=models.CASCADE)
+    file = models.FileField(upload_to='task_files/')
+    uploaded_at = models.DateTimeField()
+
+    def __str__(self):
+        return f'{self.file.name}'
+
+
+class TaskActivity(models.Model):
+    """
+    Запись журнала изменений задачи, ее комментариев и файлов. Таблица только дополняется.
+    Ссылки хранятся как числа без внешних ключей, поэтому история сохраняется после удаления
+    или переноса задачи в архив.
+    """
+    TASK = 1
+    COMMENT = 2
+    FILE = 3
+    OBJECT_TYPES = [
+        (TASK, 'task'),
+        (COMMENT, 'comment'),
+        (FILE, 'file'),
+    ]
+
+    CREATED = 1
+    UPDATED = 2
+    DELETED = 3
+    ACTIONS = [
+        (CREATED, 'created'),
+        (UPDATED, 'updated'),
+        (DELETED, 'deleted'),
+    ]
+
+    task_id = models.BigIntegerField()
+    actor_id = models.BigIntegerField(null=True, blank=True)
+    object_type = models.PositiveSmallIntegerField(choices=OBJECT_TYPES)
+    object_id = models.BigIntegerField()
+    action = models.PositiveSmallIntegerField(choices=ACTIONS)
+    # Изменения полей в виде {поле: [старое значение, новое значение]}
+    changes = models.JSONField(default=dict, blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            # Постраничное чтение истории задачи по ключу (task_id, id)
+            models.Index(fields=['task_id', '-id'], name='activity_task_id_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.get_object_type_display()} {self.object_id} {self.get_action_display()}'
+
+
+class TaskDailyStats(models.Model):
+    """
+    Дневные агрегаты задач по исполнителю. Обновляются инкрементально при изменении задач:
+    вклад старого состояния задачи вычитается, нового - прибавляется отдельной строкой-дельтой.
+    Строк с одинаковым ключом может быть несколько, поэтому значения всегда суммируются.
+    """
+    day = models.DateField()
+    assignee_id = models.BigIntegerField(null=True, blank=True)
+    created = models.IntegerField(default=0)
+    completed = models.IntegerField(default=0)
+    # Выполнены позже дедлайна
+    completed_late = models.IntegerField(default=0)
+    # Сумма времени от создания до выполнения в секундах
+    completion_seconds = models.BigIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['day', 'assignee_id'], name='stats_day_assignee_idx'),
+        ]
+
+
+class TaskLatencyBucket(models.Model):
+    """
+    Гистограмма времени выполнения задач по дням и исполнителям для оценки медианы
+    """
+    day = models.DateField()
+    assignee_id = models.BigIntegerField(null=True, blank=True)
+    bucket = models.PositiveSmallIntegerField()
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['day', 'assignee_id', 'bucket'], name='latency_day_assignee_idx'),
+        ]
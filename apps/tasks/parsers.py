@@ -0,0 +1,41 @@
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser, JSONParser, FormParser, MultiPartParser
+
+from .renderers import orjson, msgpack
+
+
+class ORJSONParser(BaseParser):
+    """
+    Разбор JSON на основе orjson
+    """
+    media_type = 'application/json'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return orjson.loads(stream.read())
+        except orjson.JSONDecodeError as exc:
+            raise ParseError(f'JSON parse error - {exc}')
+
+
+class MessagePackParser(BaseParser):
+    """
+    Разбор тела запроса в формате MessagePack
+    """
+    media_type = 'application/msgpack'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return msgpack.unpackb(stream.read(), raw=False)
+        except (ValueError, msgpack.ExtraData, msgpack.FormatError, msgpack.StackError) as exc:
+            raise ParseError(f'MessagePack parse error - {exc}')
+
+
+def get_parser_classes():
+    """
+    Список парсеров с учетом установленных библиотек. Выбор парсера происходит по заголовку Content-Type.
+    """
+    parser_classes = [ORJSONParser if orjson is not None else JSONParser]
+    if msgpack is not None:
+        parser_classes.append(MessagePackParser)
+    parser_classes += [FormParser, MultiPartParser]
+    return parser_classes
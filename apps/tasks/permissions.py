@@ -6,4 +6,5 @@ class IsOwnerOrAssignee(permissions.BasePermission):
     Ограничение на изменение задачи только ее автором или назнченным
     """
     def has_object_permission(self, request, view, obj):
-        return obj.created_by == request.user or obj.assigned_to == request.user
+        # Сравнение по *_id не требует загрузки связанных пользователей
+        return obj.created_by_id == request.user.id or obj.assigned_to_id == request.user.id
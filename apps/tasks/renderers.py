@@ -0,0 +1,88 @@
+import json
+
+from rest_framework.renderers import BaseRenderer, JSONRenderer, BrowsableAPIRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+# orjson и msgpack - необязательные зависимости, без них API работает на стандартном JSONRenderer
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+_encoder = JSONEncoder()
+
+
+def encode_default(obj):
+    """
+    Преобразование типов, которые не поддерживаются orjson/msgpack напрямую (Decimal, lazy-строки и т.д.)
+    """
+    return _encoder.default(obj)
+
+
+class ORJSONRenderer(BaseRenderer):
+    """
+    Рендерер JSON на основе orjson
+    """
+    media_type = 'application/json'
+    format = 'json'
+    charset = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return orjson.dumps(data, default=encode_default, option=orjson.OPT_NON_STR_KEYS)
+
+
+class MessagePackRenderer(BaseRenderer):
+    """
+    Компактный бинарный формат MessagePack для внутренних сервисов
+    """
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return msgpack.packb(data, default=encode_default, use_bin_type=True)
+
+
+class ExportRenderer(BaseRenderer):
+    """
+    Формат выгрузки для согласования по заголовку Accept. Сам поток формируется в export.py,
+    рендерер используется только для ответов с ошибкой.
+    """
+    charset = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return json.dumps(data, cls=JSONEncoder, ensure_ascii=False).encode()
+
+
+class NDJSONExportRenderer(ExportRenderer):
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+
+
+class CSVExportRenderer(ExportRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+
+
+def get_renderer_classes():
+    """
+    Список рендереров с учетом установленных библиотек. Выбор формата происходит по заголовку Accept.
+    """
+    renderer_classes = [ORJSONRenderer if orjson is not None else JSONRenderer]
+    if msgpack is not None:
+        renderer_classes.append(MessagePackRenderer)
+    renderer_classes.append(BrowsableAPIRenderer)
+    return renderer_classes
@@ -0,0 +1,237 @@
+import bisect
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Sum
+from django.db.models.signals import pre_delete
+from django.utils import timezone
+
+from .models import Task, ArchivedTask, TaskDailyStats, TaskLatencyBucket
+
+
+# Поля задачи, от которых зависят агрегаты
+STATE_FIELDS = ('assigned_to_id', 'created_at', 'is_completed', 'completed_at', 'deadline')
+
+STATS_FIELDS = ('created', 'completed', 'completed_late', 'completion_seconds')
+
+# Верхние границы корзин гистограммы времени выполнения в секундах, последняя корзина не ограничена сверху
+LATENCY_BUCKET_BOUNDS = [60 * minutes for minutes in (
+    1, 5, 15, 30, 60, 2 * 60, 4 * 60, 8 * 60, 12 * 60,
+    24 * 60, 2 * 24 * 60, 3 * 24 * 60, 7 * 24 * 60, 14 * 24 * 60, 30 * 24 * 60, 60 * 24 * 60, 90 * 24 * 60,
+)]
+
+
+def latency_bucket(seconds):
+    return bisect.bisect_left(LATENCY_BUCKET_BOUNDS, seconds)
+
+
+def task_state(task):
+    return tuple(getattr(task, field) for field in STATE_FIELDS)
+
+
+class RollupDelta:
+    """
+    Изменения агрегатов, накопленные по вкладам состояний задач: +1 для нового состояния, -1 для старого.
+    Вклад задачи: создание в день created_at, выполнение, опоздание и время выполнения в день completed_at.
+    """
+
+    def __init__(self):
+        self.stats = defaultdict(Counter)
+        self.buckets = Counter()
+
+    def add(self, state, sign=1):
+        assignee_id, created_at, is_completed, completed_at, deadline = state
+        self.stats[(timezone.localdate(created_at), assignee_id)]['created'] += sign
+        if not is_completed or completed_at is None:
+            return
+        key = (timezone.localdate(completed_at), assignee_id)
+        seconds = max(int((completed_at - created_at).total_seconds()), 0)
+        stats = self.stats[key]
+        stats['completed'] += sign
+        if deadline is not None and completed_at > deadline:
+            stats['completed_late'] += sign
+        stats['completion_seconds'] += sign * seconds
+        self.buckets[key + (latency_bucket(seconds),)] += sign
+
+    def changed_stats(self):
+        for key, values in self.stats.items():
+            values = {field: value for field, value in values.items() if value}
+            if values:
+                yield key, values
+
+    def changed_buckets(self):
+        return [(key, count) for key, count in self.buckets.items() if count]
+
+    def apply(self):
+        """
+        Запись изменений новыми строками-дельтами без UPDATE существующих строк: параллельные транзакции
+        не блокируют друг друга на строке (день, исполнитель) и не могут взаимно заблокироваться.
+        Строки одного ключа суммируются при чтении и сворачиваются функцией compact_rollups.
+        """
+        with transaction.atomic(savepoint=False):
+            TaskDailyStats.objects.bulk_create([
+                TaskDailyStats(day=day, assignee_id=assignee_id, **values)
+                for (day, assignee_id), values in self.changed_stats()
+            ])
+            TaskLatencyBucket.objects.bulk_create([
+                TaskLatencyBucket(day=day, assignee_id=assignee_id, bucket=bucket, count=count)
+                for (day, assignee_id, bucket), count in self.changed_buckets()
+            ])
+
+
+def record_task_changes(changes):
+    """
+    Обновление агрегатов по списку пар (старое состояние, новое состояние).
+    None вместо состояния означает, что задачи до изменения не было или она удалена.
+    """
+    delta = RollupDelta()
+    for old_state, new_state in changes:
+        if old_state == new_state:
+            continue
+        if old_state is not None:
+            delta.add(old_state, -1)
+        if new_state is not None:
+            delta.add(new_state, 1)
+    delta.apply()
+
+
+def record_task_change(old_state, new_state):
+    record_task_changes([(old_state, new_state)])
+
+
+def on_user_delete(sender, instance, **kwargs):
+    """
+    Удаление пользователя меняет задачи в обход API: созданные им задачи удаляются каскадно,
+    у назначенных ему задач сбрасывается исполнитель. Агрегаты обновляются в той же транзакции до удаления.
+    """
+    changes = []
+    for model in (Task, ArchivedTask):
+        for state in model.objects.filter(created_by=instance).values_list(*STATE_FIELDS):
+            changes.append((state, None))
+        assigned = model.objects.filter(assigned_to=instance).exclude(created_by=instance)
+        for state in assigned.values_list(*STATE_FIELDS):
+            changes.append((state, (None,) + state[1:]))
+    record_task_changes(changes)
+
+
+def connect_signals():
+    pre_delete.connect(on_user_delete, sender=User, dispatch_uid='rollups_user_delete')
+
+
+def rebuild_rollups(chunk_size=None):
+    """
+    Полный пересчет агрегатов по основной и архивной таблицам задач
+    """
+    chunk_size = chunk_size or settings.TASK_STATS_BATCH_SIZE
+    delta = RollupDelta()
+    for model in (Task, ArchivedTask):
+        for state in model.objects.values_list(*STATE_FIELDS).iterator(chunk_size=chunk_size):
+            delta.add(state)
+    with transaction.atomic():
+        TaskDailyStats.objects.all().delete()
+        TaskLatencyBucket.objects.all().delete()
+        TaskDailyStats.objects.bulk_create([
+            TaskDailyStats(day=day, assignee_id=assignee_id, **values)
+            for (day, assignee_id), values in delta.changed_stats()
+        ], batch_size=chunk_size)
+        TaskLatencyBucket.objects.bulk_create([
+            TaskLatencyBucket(day=day, assignee_id=assignee_id, bucket=bucket, count=count)
+            for (day, assignee_id, bucket), count in delta.changed_buckets()
+        ], batch_size=chunk_size)
+    return len(delta.stats)
+
+
+def compact_rollups(chunk_size=None):
+    """
+    Свертка строк-дельт: строки одного ключа заменяются одной строкой с суммой, нулевые строки удаляются.
+    Удаляются только прочитанные строки, поэтому дельты, записанные во время свертки, сохраняются.
+    Возвращает количество строк до и после свертки.
+    """
+    chunk_size = chunk_size or settings.TASK_STATS_BATCH_SIZE
+    delta = RollupDelta()
+    stats_ids = []
+    for row in TaskDailyStats.objects.values_list('id', 'day', 'assignee_id', *STATS_FIELDS).iterator(
+            chunk_size=chunk_size):
+        stats_ids.append(row[0])
+        stats = delta.stats[(row[1], row[2])]
+        for field, value in zip(STATS_FIELDS, row[3:]):
+            stats[field] += value
+    bucket_ids = []
+    for row_id, day, assignee_id, bucket, count in TaskLatencyBucket.objects.values_list(
+            'id', 'day', 'assignee_id', 'bucket', 'count').iterator(chunk_size=chunk_size):
+        bucket_ids.append(row_id)
+        delta.buckets[(day, assignee_id, bucket)] += count
+    with transaction.atomic():
+        for model, ids in ((TaskDailyStats, stats_ids), (TaskLatencyBucket, bucket_ids)):
+            for start in range(0, len(ids), chunk_size):
+                model.objects.filter(id__in=ids[start:start + chunk_size]).delete()
+        delta.apply()
+    return len(stats_ids) + len(bucket_ids), len(list(delta.changed_stats())) + len(delta.changed_buckets())
+
+
+def median_seconds(buckets):
+    """
+    Оценка медианы по гистограмме {корзина: количество}: верхняя граница корзины, в которую попадает медиана
+    """
+    total = sum(buckets.values())
+    if total <= 0:
+        return None
+    seen = 0
+    for bucket in sorted(buckets):
+        seen += buckets[bucket]
+        if seen * 2 >= total:
+            return LATENCY_BUCKET_BOUNDS[min(bucket, len(LATENCY_BUCKET_BOUNDS) - 1)]
+
+
+def summarize(values, buckets):
+    completed = values['completed']
+    return {
+        'created': values['created'],
+        'completed': completed,
+        'completed_late': values['completed_late'],
+        'overdue_rate': values['completed_late'] / completed if completed else None,
+        'avg_completion_seconds': values['completion_seconds'] / completed if completed else None,
+        'median_completion_seconds': median_seconds(buckets),
+    }
+
+
+def get_stats(date_from, date_to, assignee_id=None):
+    """
+    Статистика за период [date_from, date_to] из агрегатов: по дням и по исполнителям
+    """
+    stats = TaskDailyStats.objects.filter(day__range=(date_from, date_to))
+    buckets = TaskLatencyBucket.objects.filter(day__range=(date_from, date_to))
+    if assignee_id is not None:
+        stats = stats.filter(assignee_id=assignee_id)
+        buckets = buckets.filter(assignee_id=assignee_id)
+    sums = {field: Sum(field) for field in STATS_FIELDS}
+
+    total_buckets = Counter()
+    assignee_buckets = defaultdict(Counter)
+    for row_assignee_id, bucket, count in buckets.values('assignee_id', 'bucket').annotate(
+            total=Sum('count')).values_list('assignee_id', 'bucket', 'total'):
+        total_buckets[bucket] += count
+        assignee_buckets[row_assignee_id][bucket] += count
+
+    assignees = list(stats.values('assignee_id').annotate(**sums).order_by('assignee_id'))
+    usernames = dict(User.objects.filter(id__in=[row['assignee_id'] for row in assignees]).values_list(
+        'id', 'username'))
+    totals = stats.aggregate(**sums)
+    return {
+        'date_from': date_from.isoformat(),
+        'date_to': date_to.isoformat(),
+        'totals': summarize({field: totals[field] or 0 for field in STATS_FIELDS}, total_buckets),
+        'days': [
+            {'day': row['day'].isoformat(), **{field: row[field] for field in STATS_FIELDS}}
+            for row in stats.values('day').annotate(**sums).order_by('day')
+        ],
+        'assignees': [
+            {
+                'assigned_to': usernames.get(row['assignee_id']),
+                **summarize(row, assignee_buckets[row['assignee_id']]),
+            }
+            for row in assignees
+        ],
+    }
@@ -0,0 +1,212 @@
+import heapq
+import logging
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import DatabaseError, close_old_connections
+from django.utils import timezone
+
+from .models import Task
+from .signals import task_deadline_reminder, task_overdue, task_deadline_changed
+
+
+logger = logging.getLogger(__name__)
+
+REMINDER = 'reminder'
+OVERDUE = 'overdue'
+
+NOTIFICATION_FIELDS = {
+    REMINDER: 'reminder_sent_at',
+    OVERDUE: 'overdue_notified_at',
+}
+
+SIGNALS = {
+    REMINDER: task_deadline_reminder,
+    OVERDUE: task_overdue,
+}
+
+
+class DeadlineScheduler:
+    """
+    Очередь дедлайнов в памяти: min-куча событий (время срабатывания, задача, тип события).
+
+    В кучу загружаются только дедлайны из ближайшего окна. Окно периодически дочитывается:
+    читаются только измененные с прошлого раза задачи и новая часть окна по частичному индексу.
+    При изменении дедлайна новая запись добавляется за O(log n), а устаревшая отбрасывается при извлечении. Перед отправкой события
+    задачи пачкой перепроверяются в базе, поэтому изменения из других процессов не теряются.
+    """
+
+    def __init__(self, window=None, remind_before=None, poll_interval=None, batch_size=None):
+        self.window = window or settings.TASK_SCHEDULER_WINDOW
+        self.remind_before = remind_before or settings.TASK_REMINDER_BEFORE
+        self.poll_interval = poll_interval or settings.TASK_SCHEDULER_POLL_INTERVAL
+        self.batch_size = batch_size or settings.TASK_SCHEDULER_BATCH_SIZE
+        self.heap = []
+        # Актуальный дедлайн для каждой пары (задача, событие), записи кучи с другим дедлайном устарели
+        self.scheduled = {}
+        self.loaded_until = None
+        self.refilled_at = None
+        self.next_refill = None
+        self.wakeup = threading.Event()
+        self.stopped = threading.Event()
+
+    def __len__(self):
+        return len(self.scheduled)
+
+    def push(self, task_id, kind, fire_at, deadline):
+        key = (task_id, kind)
+        if self.scheduled.get(key) == deadline:
+            return
+        self.scheduled[key] = deadline
+        heapq.heappush(self.heap, (fire_at, task_id, kind, deadline))
+
+    def schedule(self, task_id, deadline, reminder_sent=False, overdue_sent=False, now=None):
+        now = now or timezone.now()
+        fire_times = {}
+        # Дедлайн за пределами окна будет загружен при следующем дочитывании
+        if deadline is not None and not overdue_sent and (self.loaded_until is None or deadline < self.loaded_until):
+            if not reminder_sent and deadline > now:
+                fire_times[REMINDER] = deadline - self.remind_before
+            fire_times[OVERDUE] = deadline
+        for kind in (REMINDER, OVERDUE):
+            if kind in fire_times:
+                self.push(task_id, kind, fire_times[kind], deadline)
+            else:
+                self.scheduled.pop((task_id, kind), None)
+
+    def reschedule(self, task):
+        """
+        Перепланирование задачи после изменения дедлайна или статуса
+        """
+        if task.is_completed:
+            self.schedule(task.id, None)
+        else:
+            self.schedule(task.id, task.deadline, task.reminder_sent_at is not None,
+                          task.overdue_notified_at is not None)
+        self.wakeup.set()
+
+    def on_deadline_changed(self, sender, task, **kwargs):
+        self.reschedule(task)
+
+    def connect(self):
+        task_deadline_changed.connect(self.on_deadline_changed, dispatch_uid='deadline_scheduler')
+
+    def disconnect(self):
+        task_deadline_changed.disconnect(dispatch_uid='deadline_scheduler')
+
+    def refill(self, now):
+        """
+        Дочитывание окна [.., now + window + remind_before). Первый раз окно читается целиком
+        по частичному индексу, дальше - только задачи, измененные с прошлого дочитывания,
+        и дедлайны из вновь открывшейся части окна.
+        """
+        horizon = now + self.window + self.remind_before
+        previous_horizon, refilled_at = self.loaded_until, self.refilled_at
+        self.loaded_until = horizon
+        if previous_horizon is None:
+            self.load_window(None, horizon, now)
+        else:
+            # Перекрытие на один интервал, чтобы не пропустить транзакции, зафиксированные после прошлого чтения
+            self.load_changes(refilled_at - self.poll_interval, now)
+            if horizon > previous_horizon:
+                self.load_window(previous_horizon, horizon, now)
+        self.refilled_at = now
+        self.next_refill = now + self.poll_interval
+
+    def load_window(self, start, end, now):
+        rows = Task.objects.filter(is_completed=False, overdue_notified_at__isnull=True, deadline__lt=end)
+        if start is not None:
+            rows = rows.filter(deadline__gte=start)
+        rows = rows.order_by('deadline').values_list('id', 'deadline', 'reminder_sent_at')
+        for task_id, deadline, reminder_sent_at in rows.iterator(chunk_size=self.batch_size):
+            self.schedule(task_id, deadline, reminder_sent_at is not None, now=now)
+
+    def load_changes(self, since, now):
+        """
+        Перепланирование задач, измененных после since: новый дедлайн, выполнение, сброс уведомлений
+        """
+        rows = Task.objects.filter(updated_at__gte=since).values_list(
+            'id', 'deadline', 'is_completed', 'reminder_sent_at', 'overdue_notified_at')
+        for task_id, deadline, is_completed, reminder_sent_at, overdue_notified_at in rows.iterator(
+                chunk_size=self.batch_size):
+            if is_completed:
+                self.schedule(task_id, None)
+            else:
+                self.schedule(task_id, deadline, reminder_sent_at is not None, overdue_notified_at is not None,
+                              now=now)
+
+    def pop_due(self, now):
+        """
+        Извлечение наступивших событий, сгруппированных по типу
+        """
+        due = defaultdict(dict)
+        while self.heap and self.heap[0][0] <= now:
+            fire_at, task_id, kind, deadline = heapq.heappop(self.heap)
+            if self.scheduled.get((task_id, kind)) != deadline:
+                continue  # запись устарела после перепланирования
+            del self.scheduled[(task_id, kind)]
+            due[kind][task_id] = deadline
+        return due
+
+    def fire(self, kind, deadlines, now):
+        """
+        Отправка событий пачками. Задачи, которые уже выполнены или получили новый дедлайн, пропускаются.
+        """
+        field = NOTIFICATION_FIELDS[kind]
+        task_ids = list(deadlines)
+        fired = 0
+        for start in range(0, len(task_ids), self.batch_size):
+            batch_ids = task_ids[start:start + self.batch_size]
+            tasks = Task.objects.filter(id__in=batch_ids, is_completed=False, **{f'{field}__isnull': True})
+            ready = []
+            for task in tasks:
+                if task.deadline == deadlines[task.id]:
+                    ready.append(task)
+                else:
+                    self.reschedule(task)
+            if not ready:
+                continue
+            Task.objects.filter(id__in=[task.id for task in ready]).update(**{field: now})
+            for task in ready:
+                setattr(task, field, now)
+            SIGNALS[kind].send(sender=Task, tasks=ready)
+            fired += len(ready)
+        if fired:
+            logger.info('Sent %s %s events', fired, kind)
+        return fired
+
+    def run_pending(self, now=None):
+        now = now or timezone.now()
+        if self.next_refill is None or now >= self.next_refill:
+            self.refill(now)
+        due = self.pop_due(now)
+        return {kind: self.fire(kind, deadlines, now) for kind, deadlines in due.items()}
+
+    def seconds_until_next(self, now=None):
+        now = now or timezone.now()
+        wakeups = [self.next_refill]
+        if self.heap:
+            wakeups.append(self.heap[0][0])
+        return max((min(wakeups) - now).total_seconds(), 0)
+
+    def run_forever(self):
+        """
+        Основной цикл: поток спит до ближайшего события или дочитывания окна
+        """
+        while not self.stopped.is_set():
+            # Соединение, оборвавшееся после перезапуска базы или по таймауту, открывается заново
+            close_old_connections()
+            try:
+                self.run_pending()
+            except DatabaseError:
+                logger.exception('Deadline scheduler iteration failed')
+                # После ошибки окно перечитывается целиком
+                self.loaded_until = None
+                self.next_refill = timezone.now() + self.poll_interval
+            self.wakeup.clear()
+            self.wakeup.wait(self.seconds_until_next())
+
+    def stop(self):
+        self.stopped.set()
+        self.wakeup.set()
@@ -1,17 +1,141 @@
+from collections import defaultdict
+
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
 from rest_framework import serializers
-from .models import Task, Comment, TaskFile
+from .models import (Task, Comment, TaskFile, ArchivedTask, ArchivedComment, ArchivedTaskFile, TaskActivity,
+                     visibility_q)
 from django.contrib.auth.models import User
 
+from .activity import record_activity, diff_fields, initial_fields
+from .exceptions import PreconditionFailed
+from .loaders import UserLoader
+from .rollups import record_task_change, task_state
+from .signals import task_deadline_changed
+
+
+class BatchedUserField(serializers.RelatedField):
+    """
+    Пользователь по имени (slug_field='username') или по id (slug_field='pk').
+    Поиск идет через UserLoader из контекста, поэтому все пользователи запроса загружаются одним запросом.
+    """
+    default_error_messages = {
+        'does_not_exist': 'Object with {slug_name}={value} does not exist.',
+        'incorrect_type': 'Incorrect type. Expected pk value, received {data_type}.',
+        'invalid': 'Invalid value.',
+    }
+
+    def __init__(self, slug_field='username', **kwargs):
+        self.slug_field = slug_field
+        kwargs.setdefault('queryset', User.objects.all())
+        super().__init__(**kwargs)
+
+    def use_pk_only_optimization(self):
+        return self.slug_field == 'pk'
+
+    def get_loader(self):
+        loader = self.context.get('user_loader')
+        if loader is None:
+            # Без загрузчика в контексте пользователи группируются в пределах корневого сериализатора
+            root = self.root
+            if not hasattr(root, '_user_loader'):
+                root._user_loader = UserLoader()
+            loader = root._user_loader
+        return loader
+
+    def to_internal_value(self, data):
+        loader = self.get_loader()
+        try:
+            if self.slug_field == 'pk':
+                if isinstance(data, bool):
+                    self.fail('incorrect_type', data_type=type(data).__name__)
+                user = loader.get_by_id(data)
+            else:
+                user = loader.get_by_username(str(data))
+        except (TypeError, ValueError):
+            self.fail('invalid')
+        if user is None:
+            self.fail('does_not_exist', slug_name=self.slug_field, value=data)
+        return user
 
-class CommentSerializer(serializers.ModelSerializer):
+    def to_representation(self, value):
+        if self.slug_field == 'pk':
+            return value.pk
+        return getattr(value, self.slug_field)
+
+
+class VisibleCommentField(serializers.PrimaryKeyRelatedField):
+    """
+    Родительский комментарий выбирается только среди комментариев задач, видимых пользователю запроса
+    """
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        request = self.context.get('request')
+        if request is None:
+            return queryset
+        return queryset.filter(visibility_q(request.user, prefix='task__'))
+
+
+class ActivityLoggingMixin:
+    """
+    Запись созданий и изменений полей в журнал активности задачи
+    """
+    activity_object_type = None
+
+    def get_activity_task_id(self, instance):
+        return instance.task_id
+
+    def get_activity_actor(self):
+        request = self.context.get('request')
+        return getattr(request, 'user', None)
+
+    def create(self, validated_data):
+        instance = super().create(validated_data)
+        record_activity(self.get_activity_task_id(instance), self.get_activity_actor(), self.activity_object_type,
+                        instance.pk, TaskActivity.CREATED, initial_fields(instance, validated_data))
+        return instance
+
+    def update(self, instance, validated_data):
+        changes = diff_fields(instance, {field: value for field, value in validated_data.items()
+                                         if field in self.fields})
+        instance = self.write_changes(instance, validated_data)
+        if changes:
+            record_activity(self.get_activity_task_id(instance), self.get_activity_actor(),
+                            self.activity_object_type, instance.pk, TaskActivity.UPDATED, changes)
+        return instance
+
+    def write_changes(self, instance, validated_data):
+        return super().update(instance, validated_data)
+
+
+class CommentSerializer(ActivityLoggingMixin, serializers.ModelSerializer):
     """
     Сериализатор для комментариев
     """
     author = serializers.ReadOnlyField(source='author.username')
+    parent = VisibleCommentField(queryset=Comment.objects.all(), allow_null=True, required=False)
+    activity_object_type = TaskActivity.COMMENT
 
     class Meta:
         model = Comment
-        fields = ['id', 'author', 'content', 'created_at']
+        fields = ['id', 'author', 'parent', 'depth', 'content', 'created_at']
+        read_only_fields = ['depth']
+
+    def validate(self, attrs):
+        parent = attrs.get('parent')
+        if parent is not None and self.instance is None:
+            if str(parent.task_id) != str(self.initial_data.get('task_id')):
+                raise serializers.ValidationError({"parent": "Комментарий относится к другой задаче."})
+            if parent.depth + 1 > settings.COMMENT_MAX_DEPTH:
+                raise serializers.ValidationError({"parent": "Превышена максимальная глубина ответов."})
+        return attrs
+
+    def update(self, instance, validated_data):
+        # Перенос комментария в другую ветку не поддерживается, путь задается при создании
+        validated_data.pop('parent', None)
+        return super().update(instance, validated_data)
 
 
 class TaskFileSerializer(serializers.ModelSerializer):
@@ -29,20 +153,198 @@ class TaskSerializer(serializers.ModelSerializer):
     Сериализатор для получениия задач
     """
     created_by = serializers.ReadOnlyField(source='created_by.username')
-    assigned_to = serializers.SlugRelatedField(slug_field='username', queryset=User.objects.all(), allow_null=True)
+    assigned_to = BatchedUserField(slug_field='username', allow_null=True)
     comments = CommentSerializer(many=True, read_only=True)
     files = TaskFileSerializer(many=True, read_only=True)
 
     class Meta:
         model = Task
         fields = ['id', 'title', 'description', 'created_by', 'assigned_to', 'is_completed', 'created_at',
-                  'updated_at', 'comments', 'files']
+                  'updated_at', 'version', 'comments', 'files']
+
+
+class TaskValuesSerializer:
+    """
+    Быстрая сериализация списка задач только для чтения.
+    Данные берутся из values() тремя запросами без создания моделей и полей сериализатора,
+    результат совпадает с TaskSerializer(many=True).
+    """
+    datetime_field = serializers.DateTimeField()
+
+    def __init__(self, queryset, context=None):
+        self.queryset = queryset
+        self.context = context or {}
+
+    def format_datetime(self, value):
+        return None if value is None else self.datetime_field.to_representation(value)
+
+    def format_file(self, name, storage):
+        if not name:
+            return None
+        url = storage.url(name)
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request is not None else url
+
+    @property
+    def data(self):
+        task_ids = self.queryset.values('id')
+        comments = defaultdict(list)
+        for row in Comment.objects.filter(task_id__in=task_ids).order_by('id').values_list(
+                'id', 'task_id', 'author__username', 'parent_id', 'depth', 'content', 'created_at'):
+            comments[row[1]].append({
+                'id': row[0],
+                'author': row[2],
+                'parent': row[3],
+                'depth': row[4],
+                'content': row[5],
+                'created_at': self.format_datetime(row[6]),
+            })
+        files = defaultdict(list)
+        storage = TaskFile._meta.get_field('file').storage
+        for row in TaskFile.objects.filter(task_id__in=task_ids).order_by('id').values_list(
+                'id', 'task_id', 'file', 'uploaded_at'):
+            files[row[1]].append({
+                'id': row[0],
+                'file': self.format_file(row[2], storage),
+                'uploaded_at': self.format_datetime(row[3]),
+            })
+        return [
+            {
+                'id': row[0],
+                'title': row[1],
+                'description': row[2],
+                'created_by': row[3],
+                'assigned_to': row[4],
+                'is_completed': row[5],
+                'created_at': self.format_datetime(row[6]),
+                'updated_at': self.format_datetime(row[7]),
+                'version': row[8],
+                'comments': comments.get(row[0], []),
+                'files': files.get(row[0], []),
+            }
+            for row in self.queryset.values_list(
+                'id', 'title', 'description', 'created_by__username', 'assigned_to__username',
+                'is_completed', 'created_at', 'updated_at', 'version')
+        ]
 
 
-class TaskCreateUpdateSerializer(serializers.ModelSerializer):
+class TaskCreateUpdateSerializer(ActivityLoggingMixin, serializers.ModelSerializer):
     """
     Сериализатор для создания и редактирования задач
     """
+    assigned_to = BatchedUserField(slug_field='pk', allow_null=True, required=False)
+    version = serializers.IntegerField(min_value=1, required=False)
+    activity_object_type = TaskActivity.TASK
+
     class Meta:
         model = Task
-        fields = ['id', 'title', 'description', 'assigned_to', 'is_completed']
+        fields = ['id', 'title', 'description', 'assigned_to', 'is_completed', 'deadline', 'version']
+
+    def get_expected_version(self, instance, version):
+        """
+        Версия, от которой клиент делал изменения: заголовок If-Match, поле version или загруженная задача
+        """
+        expected_version = self.context.get('expected_version')
+        if expected_version is None:
+            expected_version = version
+        return instance.version if expected_version is None else expected_version
+
+    def create(self, validated_data):
+        validated_data.pop('version', None)
+        if validated_data.get('is_completed'):
+            validated_data['completed_at'] = timezone.now()
+        instance = super().create(validated_data)
+        record_task_change(None, task_state(instance))
+        if instance.deadline is not None:
+            task_deadline_changed.send(sender=Task, task=instance)
+        return instance
+
+    def update(self, instance, validated_data):
+        validated_data.pop('version', None)
+        old_state = task_state(instance)
+        deadline_changed = 'deadline' in validated_data and validated_data['deadline'] != instance.deadline
+        if deadline_changed:
+            # Новый дедлайн - уведомления отправляются заново
+            validated_data['reminder_sent_at'] = None
+            validated_data['overdue_notified_at'] = None
+        if 'is_completed' in validated_data and validated_data['is_completed'] != instance.is_completed:
+            validated_data['completed_at'] = timezone.now() if validated_data['is_completed'] else None
+        instance = super().update(instance, validated_data)
+        record_task_change(old_state, task_state(instance))
+        if deadline_changed:
+            task_deadline_changed.send(sender=Task, task=instance)
+        return instance
+
+    def write_changes(self, instance, validated_data):
+        """
+        Условный UPDATE только измененных полей: строка меняется, только если ее версия
+        совпадает с ожидаемой. Блокировка не берется, при конфликте возвращается 412.
+        """
+        expected_version = self.get_expected_version(instance, self.validated_data.get('version'))
+        changed = {field: validated_data[field] for field in diff_fields(instance, validated_data)}
+        if not changed:
+            if instance.version != expected_version:
+                raise PreconditionFailed()
+            return instance
+        updated_at = timezone.now()
+        updated = Task.objects.filter(pk=instance.pk, version=expected_version).update(
+            **changed, version=F('version') + 1, updated_at=updated_at)
+        if not updated:
+            raise PreconditionFailed()
+        for field, value in changed.items():
+            setattr(instance, field, value)
+        instance.version = expected_version + 1
+        instance.updated_at = updated_at
+        return instance
+
+    def get_activity_task_id(self, instance):
+        return instance.pk
+
+
+class TaskActivitySerializer(serializers.ModelSerializer):
+    """
+    Сериализатор для журнала активности задачи
+    """
+    object_type = serializers.CharField(source='get_object_type_display')
+    action = serializers.CharField(source='get_action_display')
+
+    class Meta:
+        model = TaskActivity
+        fields = ['id', 'actor_id', 'object_type', 'object_id', 'action', 'changes', 'created_at']
+
+
+class ArchivedCommentSerializer(serializers.ModelSerializer):
+    """
+    Сериализатор для комментариев архивных задач
+    """
+    author = serializers.ReadOnlyField(source='author.username')
+    parent = serializers.ReadOnlyField(source='parent_id')
+
+    class Meta:
+        model = ArchivedComment
+        fields = ['id', 'author', 'parent', 'depth', 'content', 'created_at']
+
+
+class ArchivedTaskFileSerializer(serializers.ModelSerializer):
+    """
+    Сериализатор для файлов архивных задач
+    """
+
+    class Meta:
+        model = ArchivedTaskFile
+        fields = ['id', 'file', 'uploaded_at']
+
+
+class ArchivedTaskSerializer(serializers.ModelSerializer):
+    """
+    Сериализатор для получения архивных задач: формат TaskSerializer и время переноса в архив archived_at
+    """
+    created_by = serializers.ReadOnlyField(source='created_by.username')
+    assigned_to = serializers.ReadOnlyField(source='assigned_to.username', default=None)
+    comments = ArchivedCommentSerializer(many=True, read_only=True)
+    files = ArchivedTaskFileSerializer(many=True, read_only=True)
+
+    class Meta:
+        model = ArchivedTask
+        fields = ['id', 'title', 'description', 'created_by', 'assigned_to', 'is_completed', 'created_at',
+                  'updated_at', 'version', 'archived_at', 'comments', 'files']
@@ -0,0 +1,11 @@
+from django.dispatch import Signal
+
+
+# Приближение дедлайна, аргумент tasks - список задач
+task_deadline_reminder = Signal()
+
+# Дедлайн прошел, а задача не выполнена, аргумент tasks - список задач
+task_overdue = Signal()
+
+# Дедлайн задачи изменен через API, аргумент task
+task_deadline_changed = Signal()
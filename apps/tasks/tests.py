@@ -1,10 +1,38 @@
+import csv
+import gzip
+import json
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+from functools import partial
+from io import StringIO
+from unittest import mock, skipIf
+
 from django.core.files.uploadedfile import SimpleUploadedFile
-from rest_framework.test import APITestCase
+from django.core.management import call_command
+from django.db import DatabaseError, connection
+from django.db.models import Sum
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.test import APITestCase, APIRequestFactory
 from django.contrib.auth.models import User
 from rest_framework_simplejwt.tokens import RefreshToken
 
-from apps.tasks.models import Task, Comment, TaskFile
-from apps.tasks.views import MAX_FILE_SIZE
+from apps.tasks.activity import ActivityBuffer, activity_buffer
+from apps.tasks.archive import archive_batch, archive_completed_tasks
+from apps.tasks.loaders import UserLoader
+from apps.tasks.importer import TaskImporter, iter_csv_records
+from apps.tasks.models import (Task, Comment, TaskFile, ArchivedTask, TaskActivity, TaskDailyStats,
+                               TaskLatencyBucket)
+from apps.tasks.renderers import orjson, msgpack
+from apps.tasks.rollups import STATS_FIELDS, rebuild_rollups
+from apps.tasks.scheduler import DeadlineScheduler
+from apps.tasks.serializers import TaskSerializer, TaskValuesSerializer
+from apps.tasks.signals import task_deadline_reminder, task_overdue
+from apps.tasks.views import MAX_FILE_SIZE, TaskViewSet
+from smarteducation.warmup import warm_serializers, warm_urls
 
 
 class JWTAuthTests(APITestCase):
@@ -195,19 +223,13 @@ class TaskManagementIntegrationTests(APITestCase):
         self.assertEqual(task.created_by, self.user1)
         self.assertEqual(task.assigned_to, self.user1)
 
-        # 3. Добавление комментария к задаче user2
+        # 3. Комментарий user2 к чужой задаче — задача ему не видна
         self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.access_token_user2}')
         response = self.client.post('/comments/', {
             'task_id': task_id,
             'content': 'This is a test comment by user2'
         })
-        self.assertEqual(response.status_code, 201)
-
-        # Проверяем, что комментарий добавлен
-        self.assertEqual(Comment.objects.filter(task=task_id).count(), 1)
-        comment = Comment.objects.get(task_id=task_id)
-        self.assertEqual(comment.content, 'This is a test comment by user2')
-        self.assertEqual(comment.author, self.user2)
+        self.assertEqual(response.status_code, 404)
 
         # 4. Попытка изменения задачи user2 — должно быть запрещено
         response = self.client.put(f'/tasks/{task_id}/', {
@@ -228,6 +250,21 @@ class TaskManagementIntegrationTests(APITestCase):
         task.refresh_from_db()
         self.assertEqual(task.title, 'Updated Task by user1')
 
+        # Добавление комментария исполнителем задачи (user2)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.access_token_user2}')
+        response = self.client.post('/comments/', {
+            'task_id': task_id,
+            'content': 'This is a test comment by user2'
+        })
+        self.assertEqual(response.status_code, 201)
+
+        # Проверяем, что комментарий добавлен
+        self.assertEqual(Comment.objects.filter(task=task_id).count(), 1)
+        comment = Comment.objects.get(task_id=task_id)
+        self.assertEqual(comment.content, 'This is a test comment by user2')
+        self.assertEqual(comment.author, self.user2)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.access_token_user1}')
+
         # 6. Пометка задачи как выполненной
         response = self.client.patch(f'/tasks/{task_id}/', {'is_completed': True})
         self.assertEqual(response.status_code, 200)
@@ -304,3 +341,814 @@ class TaskFileUploadTests(APITestCase):
 
         # Проверяем, что сервер возвращает ошибку 401 Unauthorized
         self.assertEqual(response.status_code, 401)
+
+
+class TaskArchiveTests(APITestCase):
+    """
+    Тесты для переноса выполненных задач в архив
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpass')
+        self.old_task = Task.objects.create(title='Old Task', created_by=self.user, is_completed=True)
+        self.recent_task = Task.objects.create(title='Recent Task', created_by=self.user, is_completed=True)
+        self.open_task = Task.objects.create(title='Open Task', created_by=self.user)
+        Comment.objects.create(task=self.old_task, author=self.user, content='Old comment')
+        Task.objects.filter(id=self.old_task.id).update(completed_at=timezone.now() - timedelta(days=60))
+        Task.objects.filter(id=self.recent_task.id).update(completed_at=timezone.now())
+        Task.objects.filter(id=self.open_task.id).update(updated_at=timezone.now() - timedelta(days=60))
+        self.access_token = str(RefreshToken.for_user(self.user).access_token)
+
+    def test_archive_moves_only_old_completed_tasks(self):
+        call_command('archive_tasks', '--days', '30', '--batch-size', '1', stdout=StringIO())
+        self.assertFalse(Task.objects.filter(id=self.old_task.id).exists())
+        self.assertTrue(Task.objects.filter(id=self.recent_task.id).exists())
+        self.assertTrue(Task.objects.filter(id=self.open_task.id).exists())
+        archived = ArchivedTask.objects.get(id=self.old_task.id)
+        self.assertEqual(archived.title, 'Old Task')
+        self.assertEqual(archived.comments.count(), 1)
+        self.assertFalse(Comment.objects.filter(task_id=self.old_task.id).exists())
+
+    def test_include_archived(self):
+        archive_completed_tasks(older_than_days=30)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.access_token}')
+
+        response = self.client.get('/tasks/')
+        self.assertNotIn(self.old_task.id, [task['id'] for task in response.data])
+        response = self.client.get('/tasks/', {'include_archived': 'true'})
+        self.assertIn(self.old_task.id, [task['id'] for task in response.data])
+
+        response = self.client.get(f'/tasks/{self.old_task.id}/')
+        self.assertEqual(response.status_code, 404)
+        response = self.client.get(f'/tasks/{self.old_task.id}/', {'include_archived': '1'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['comments'][0]['content'], 'Old comment')
+
+    def test_batch_skips_task_completed_again_after_selection(self):
+        cutoff = timezone.now() - timedelta(days=30)
+        # Задача переоткрыта и снова выполнена после выбора кандидатов
+        Task.objects.filter(id=self.old_task.id).update(completed_at=timezone.now())
+        self.assertEqual(archive_batch([self.old_task.id], cutoff), 0)
+        self.assertTrue(Task.objects.filter(id=self.old_task.id).exists())
+
+    def test_edit_does_not_reset_archive_clock(self):
+        Task.objects.filter(id=self.old_task.id).update(title='Edited', updated_at=timezone.now(), version=3)
+        self.assertEqual(archive_completed_tasks(older_than_days=30), 1)
+        self.assertEqual(ArchivedTask.objects.get(id=self.old_task.id).version, 3)
+
+    def test_include_archived_keeps_deadline_order(self):
+        now = timezone.now()
+        Task.objects.filter(id=self.old_task.id).update(deadline=now + timedelta(days=2))
+        Task.objects.filter(id=self.recent_task.id).update(deadline=now + timedelta(days=1))
+        Task.objects.filter(id=self.open_task.id).update(deadline=now + timedelta(days=3))
+        archive_completed_tasks(older_than_days=30)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.access_token}')
+        expected = [self.recent_task.id, self.old_task.id, self.open_task.id]
+
+        response = self.client.get('/tasks/', {'include_archived': 'true'})
+        self.assertEqual([task['id'] for task in response.data], expected)
+
+        class TwoPerPage(PageNumberPagination):
+            page_size = 2
+
+        with mock.patch.object(TaskViewSet, 'pagination_class', TwoPerPage):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get('/tasks/', {'include_archived': 'true'})
+            # Из каждой таблицы читается не больше одной страницы
+            merged = [query['sql'] for query in queries.captured_queries
+                      if query['sql'].startswith('SELECT "tasks_task"."deadline"')
+                      or query['sql'].startswith('SELECT "tasks_archivedtask"."deadline"')]
+            self.assertEqual(len(merged), 2)
+            self.assertTrue(all(sql.endswith('LIMIT 2') for sql in merged))
+            self.assertEqual(response.data['count'], 3)
+            self.assertEqual(response.data['results'][1]['version'], 1)
+            self.assertEqual([task['id'] for task in response.data['results']], expected[:2])
+            response = self.client.get('/tasks/', {'include_archived': 'true', 'page': 2})
+            self.assertEqual([task['id'] for task in response.data['results']], expected[2:])
+
+
+class TaskRenderingTests(APITestCase):
+    """
+    Тесты для быстрой сериализации списка задач и форматов ответа
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpass')
+        self.assignee = User.objects.create_user(username='assignee', password='testpass')
+        self.task = Task.objects.create(title='Task', created_by=self.user, assigned_to=self.assignee)
+        Task.objects.create(title='Unassigned Task', created_by=self.user)
+        Comment.objects.create(task=self.task, author=self.assignee, content='Comment')
+        TaskFile.objects.create(task=self.task, file='task_files/file.txt')
+        self.access_token = str(RefreshToken.for_user(self.user).access_token)
+
+    def test_values_serializer_matches_task_serializer(self):
+        request = APIRequestFactory().get('/tasks/')
+        queryset = Task.objects.order_by('id')
+        expected = TaskSerializer(queryset, many=True, context={'request': request}).data
+        actual = TaskValuesSerializer(queryset, context={'request': request}).data
+        self.assertEqual(json.loads(json.dumps(expected)), actual)
+
+    @skipIf(orjson is None, 'orjson is not installed')
+    def test_orjson_list(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.access_token}')
+        response = self.client.get('/tasks/', HTTP_ACCEPT='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(orjson.loads(response.content)[0]['comments'][0]['content'], 'Comment')
+
+    @skipIf(msgpack is None, 'msgpack is not installed')
+    def test_msgpack_roundtrip(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.access_token}')
+        response = self.client.post('/tasks/', msgpack.packb({'title': 'Packed Task'}),
+                                    content_type='application/msgpack', HTTP_ACCEPT='application/msgpack')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(msgpack.unpackb(response.content)['title'], 'Packed Task')
+
+
+class TaskExportTests(APITestCase):
+    """
+    Тесты для потоковой выгрузки задач
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpass')
+        self.task = Task.objects.create(title='Task', created_by=self.user, assigned_to=self.user)
+        Task.objects.create(title='Completed Task', created_by=self.user, assigned_to=self.user, is_completed=True)
+        Comment.objects.create(task=self.task, author=self.user, content='Comment')
+        TaskFile.objects.create(task=self.task, file='task_files/report.txt')
+        self.access_token = str(RefreshToken.for_user(self.user).access_token)
+
+    def test_export_ndjson_with_filter(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.access_token}')
+        response = self.client.get('/tasks/export/', {'assigned_to': 'testuser', 'is_completed': 'false'})
+        self.assertEqual(response.status_code, 200)
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        self.assertEqual([row['title'] for row in rows], ['Task'])
+        self.assertEqual(rows[0]['comments'][0]['content'], 'Comment')
+
+    def test_export_csv(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.access_token}')
+        response = self.client.get('/tasks/export/', {'assigned_to': 'testuser', 'export_format': 'csv'})
+        self.assertEqual(response.status_code, 200)
+        rows = list(csv.DictReader(StringIO(b''.join(response.streaming_content).decode())))
+        self.assertEqual([row['record'] for row in rows].count('task'), 2)
+        self.assertEqual([row['record'] for row in rows].count('comment'), 1)
+        file_row = next(row for row in rows if row['record'] == 'file')
+        self.assertTrue(file_row['uploaded_at'])
+
+    def test_export_format_from_accept(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.access_token}')
+        response = self.client.get('/tasks/export/', {'assigned_to': 'testuser'}, HTTP_ACCEPT='text/csv')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/csv'))
+        response = self.client.get('/tasks/export/', HTTP_ACCEPT='application/x-ndjson')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+
+    def test_export_command(self):
+        out = StringIO()
+        call_command('export_tasks', '--is-completed', 'true', '--assigned-to', 'testuser', stdout=out)
+        rows = [json.loads(line) for line in out.getvalue().splitlines()]
+        self.assertEqual([row['title'] for row in rows], ['Completed Task'])
+
+
+class TaskImportTests(APITestCase):
+    """
+    Тесты для пакетного импорта задач
+    """
+
+    def setUp(self):
+        self.admin = User.objects.create_user(username='admin', password='testpass', is_staff=True)
+        self.user = User.objects.create_user(username='testuser', password='testpass')
+        self.lines = [
+            json.dumps({'title': 'Imported 1', 'created_by': 'testuser', 'assigned_to': 'admin',
+                        'comments': [{'id': 10, 'author': 'admin', 'content': 'Imported comment'},
+                                     {'id': 11, 'parent': 10, 'author': 'testuser', 'content': 'Reply'}]}),
+            json.dumps({'title': 'Imported 2', 'created_by': 'unknown'}),
+            json.dumps({'title': 'Imported 3', 'created_by': 'testuser', 'is_completed': True}),
+        ]
+
+    def test_import_command_with_checkpoint(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'tasks.ndjson')
+            with open(path, 'w') as stream:
+                stream.write('\n'.join(self.lines))
+            with open(f'{path}.checkpoint', 'w') as checkpoint:
+                json.dump({'processed': 1}, checkpoint)
+            err = StringIO()
+            call_command('import_tasks', path, '--batch-size', '1', stdout=StringIO(), stderr=err)
+            with open(f'{path}.checkpoint') as checkpoint:
+                self.assertEqual(json.load(checkpoint)['processed'], 3)
+        self.assertFalse(Task.objects.filter(title='Imported 1').exists())
+        self.assertTrue(Task.objects.get(title='Imported 3').is_completed)
+        self.assertIn('Record 1', err.getvalue())
+
+    def test_import_endpoint(self):
+        self.client.credentials(
+            HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(self.admin).access_token}')
+        upload = SimpleUploadedFile('tasks.ndjson', '\n'.join(self.lines).encode())
+        response = self.client.post('/tasks/import/', {'file': upload}, format='multipart')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['imported_tasks'], 2)
+        self.assertEqual(response.data['imported_comments'], 2)
+        task = Task.objects.get(title='Imported 1')
+        self.assertEqual(task.assigned_to, self.admin)
+        comment = task.comments.get(parent=None)
+        self.assertEqual(comment.author, self.admin)
+        self.assertEqual([reply.content for reply in Comment.objects.subtree(comment)], ['Imported comment', 'Reply'])
+
+    def test_import_invalid_records(self):
+        self.client.credentials(
+            HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(self.admin).access_token}')
+        lines = [
+            '[1, 2]',
+            '{"title": "Broken',
+            json.dumps({'title': 'Bad comments', 'created_by': 'testuser', 'comments': [1]}),
+            self.lines[2],
+        ]
+        upload = SimpleUploadedFile('tasks.ndjson', '\n'.join(lines).encode())
+        response = self.client.post('/tasks/import/', {'file': upload}, format='multipart')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['processed'], 4)
+        self.assertEqual(response.data['imported_tasks'], 1)
+        self.assertEqual([error['record'] for error in response.data['errors']], [0, 1, 2])
+        self.assertEqual(response.data['errors'][2]['errors'], {'comments[0]': 'Expected an object.'})
+
+    def test_import_non_string_fields(self):
+        result = TaskImporter().run([
+            {'title': 123, 'created_by': 'testuser'},
+            {'title': 'Task', 'created_by': ['testuser'], 'assigned_to': {'id': 1}, 'description': 5},
+            {'title': 'Task', 'created_by': 'testuser', 'comments': [{'author': 7, 'content': ['text']}]},
+        ])
+        self.assertEqual(result['imported_tasks'], 0)
+        self.assertEqual([error['errors'] for error in result['errors']], [
+            {'title': 'Not a valid string.'},
+            {'created_by': 'Not a valid string.', 'assigned_to': 'Not a valid string.',
+             'description': 'Not a valid string.'},
+            {'comments[0]': {'author': 'Not a valid string.', 'content': 'Not a valid string.'}},
+        ])
+
+    def test_import_csv_long_field_and_broken_file(self):
+        description = 'x' * (256 * 1024)
+        lines = StringIO(f'title,created_by,description\nLong,testuser,{description}\n')
+        result = TaskImporter().run(iter_csv_records(lines))
+        self.assertEqual(result['imported_tasks'], 1)
+        self.assertEqual(len(Task.objects.get(title='Long').description), len(description))
+
+        with mock.patch('apps.tasks.importer.csv.DictReader.__next__', side_effect=csv.Error('bad row')):
+            with self.assertRaisesMessage(ValueError, 'Invalid CSV'):
+                TaskImporter().run(iter_csv_records(StringIO('title\nTask\n')))
+
+    def test_import_endpoint_requires_staff(self):
+        self.client.credentials(
+            HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(self.user).access_token}')
+        upload = SimpleUploadedFile('tasks.ndjson', '\n'.join(self.lines).encode())
+        response = self.client.post('/tasks/import/', {'file': upload}, format='multipart')
+        self.assertEqual(response.status_code, 403)
+
+
+class ProfilingTests(APITestCase):
+    """
+    Тесты для профилирования запросов по требованию
+    """
+
+    def setUp(self):
+        self.admin = User.objects.create_user(username='admin', password='testpass', is_staff=True)
+        self.user = User.objects.create_user(username='testuser', password='testpass')
+        self.profiles_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.profiles_dir, ignore_errors=True)
+
+    def test_staff_profile_capture_and_download(self):
+        with self.settings(PROFILING_ENABLED=True, PROFILING_DIR=self.profiles_dir, PROFILING_MAX_PROFILES=1):
+            self.client.credentials(
+                HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(self.admin).access_token}')
+            for mode in ('sampling', 'cprofile'):
+                response = self.client.get('/tasks/', HTTP_X_PROFILE=mode)
+                self.assertEqual(response.status_code, 200)
+                self.assertIn('X-Profile-Id', response)
+            profile_id = response['X-Profile-Id']
+            self.assertEqual(sorted(os.listdir(self.profiles_dir)),
+                             [f'{profile_id}.prof', f'{profile_id}.sql.json'])
+
+            response = self.client.get(f'/profiles/{profile_id}.sql.json')
+            self.assertEqual(response.status_code, 200)
+            self.assertGreater(json.loads(b''.join(response.streaming_content))['count'], 0)
+
+    def test_non_staff_request_is_not_profiled(self):
+        with self.settings(PROFILING_ENABLED=True, PROFILING_DIR=self.profiles_dir):
+            self.client.credentials(
+                HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(self.user).access_token}')
+            response = self.client.get('/tasks/', HTTP_X_PROFILE='cprofile')
+            self.assertNotIn('X-Profile-Id', response)
+            self.assertEqual(os.listdir(self.profiles_dir), [])
+            self.assertEqual(self.client.get('/profiles/').status_code, 403)
+
+
+class TaskVisibilityTests(APITestCase):
+    """
+    Тесты на видимость задач: пользователь видит только задачи, где он автор или исполнитель
+    """
+
+    def setUp(self):
+        self.user1 = User.objects.create_user(username='testuser1', password='testpass1')
+        self.user2 = User.objects.create_user(username='testuser2', password='testpass2')
+        self.own_task = Task.objects.create(title='Own Task', created_by=self.user1)
+        self.assigned_task = Task.objects.create(title='Assigned Task', created_by=self.user2,
+                                                 assigned_to=self.user1)
+        self.foreign_task = Task.objects.create(title='Foreign Task', created_by=self.user2)
+        Comment.objects.create(task=self.own_task, author=self.user2, content='Visible comment')
+        Comment.objects.create(task=self.foreign_task, author=self.user2, content='Hidden comment')
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(self.user1).access_token}')
+
+    def test_list_only_visible_tasks(self):
+        response = self.client.get('/tasks/')
+        self.assertEqual(sorted(task['title'] for task in response.data), ['Assigned Task', 'Own Task'])
+
+    def test_retrieve_foreign_task(self):
+        self.assertEqual(self.client.get(f'/tasks/{self.assigned_task.id}/').status_code, 200)
+        self.assertEqual(self.client.get(f'/tasks/{self.foreign_task.id}/').status_code, 404)
+
+    def test_list_only_visible_comments(self):
+        response = self.client.get('/comments/')
+        self.assertEqual([comment['content'] for comment in response.data], ['Visible comment'])
+
+    def test_comment_only_visible_tasks(self):
+        response = self.client.post('/comments/', {'task_id': self.foreign_task.id, 'content': 'Intrusion'})
+        self.assertEqual(response.status_code, 404)
+        response = self.client.post('/comments/', {'content': 'No task'})
+        self.assertEqual(response.status_code, 400)
+        hidden = Comment.objects.get(content='Hidden comment')
+        response = self.client.post('/comments/', {'task_id': self.foreign_task.id, 'parent': hidden.id,
+                                                   'content': 'Reply'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('parent', response.data)
+        self.assertFalse(Comment.objects.filter(task=self.foreign_task, author=self.user1).exists())
+        response = self.client.post('/comments/', {'task_id': self.assigned_task.id, 'content': 'Allowed'})
+        self.assertEqual(response.status_code, 201)
+
+
+class ApiSchemaTests(APITestCase):
+    """
+    Тесты для заранее сгенерированной схемы OpenAPI
+    """
+
+    def setUp(self):
+        self.schema_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.schema_dir, ignore_errors=True)
+        self.schema_file = os.path.join(self.schema_dir, 'openapi.json')
+
+    def test_generated_schema_is_served(self):
+        with self.settings(API_SCHEMA_FILE=self.schema_file):
+            call_command('generate_schema', stdout=StringIO())
+            self.assertTrue(os.path.exists(f'{self.schema_file}.gz'))
+
+            response = self.client.get('/swagger.json')
+            self.assertEqual(response.status_code, 200)
+            self.assertIn('/tasks/', json.loads(response.content)['paths'])
+
+            response = self.client.get('/swagger/', {'format': 'openapi'}, HTTP_ACCEPT_ENCODING='gzip')
+            self.assertEqual(response['Content-Encoding'], 'gzip')
+            self.assertIn('/tasks/', json.loads(gzip.decompress(response.content))['paths'])
+
+
+class DeadlineSchedulerTests(APITestCase):
+    """
+    Тесты для планировщика дедлайнов
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpass')
+        self.now = timezone.now()
+        self.soon_task = Task.objects.create(title='Soon', created_by=self.user,
+                                             deadline=self.now + timedelta(minutes=30))
+        self.overdue_task = Task.objects.create(title='Overdue', created_by=self.user,
+                                                deadline=self.now - timedelta(minutes=5))
+        self.later_task = Task.objects.create(title='Later', created_by=self.user,
+                                              deadline=self.now + timedelta(days=10))
+        Task.objects.create(title='Done', created_by=self.user, is_completed=True,
+                            deadline=self.now - timedelta(days=1))
+        self.scheduler = DeadlineScheduler(window=timedelta(hours=1), remind_before=timedelta(hours=1),
+                                           poll_interval=timedelta(minutes=1), batch_size=10)
+        self.events = []
+        for kind, signal in (('reminder', task_deadline_reminder), ('overdue', task_overdue)):
+            handler = partial(self.collect, kind)
+            signal.connect(handler, weak=False)
+            self.addCleanup(signal.disconnect, handler)
+
+    def collect(self, kind, sender, tasks, **kwargs):
+        self.events.extend((kind, task.title) for task in tasks)
+
+    def test_fires_due_events_once(self):
+        self.scheduler.run_pending(self.now)
+        self.assertCountEqual(self.events, [('reminder', 'Soon'), ('overdue', 'Overdue')])
+        self.assertEqual(len(self.scheduler), 1)  # просрочка Soon через 30 минут
+
+        self.scheduler.run_pending(self.now + timedelta(minutes=31))
+        self.assertIn(('overdue', 'Soon'), self.events)
+        self.scheduler.run_pending(self.now + timedelta(minutes=40))
+        self.assertEqual(len(self.events), 3)
+        self.assertIsNotNone(Task.objects.get(id=self.overdue_task.id).overdue_notified_at)
+
+    def test_deadline_change_through_api_reschedules(self):
+        self.scheduler.connect()
+        self.addCleanup(self.scheduler.disconnect)
+        self.scheduler.run_pending(self.now)
+        self.events.clear()
+
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(self.user).access_token}')
+        new_deadline = self.now + timedelta(days=20)
+        response = self.client.patch(f'/tasks/{self.soon_task.id}/', {'deadline': new_deadline.isoformat()})
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone(Task.objects.get(id=self.soon_task.id).reminder_sent_at)
+
+        self.scheduler.run_pending(self.now + timedelta(minutes=31))
+        self.assertEqual(self.events, [])
+
+    def test_refill_reads_only_changed_tasks(self):
+        self.scheduler.run_pending(self.now)
+        self.events.clear()
+        # Изменения из другого процесса без сигналов планировщику
+        Task.objects.filter(id=self.later_task.id).update(deadline=self.now + timedelta(minutes=20),
+                                                          updated_at=self.now)
+        Task.objects.filter(id=self.soon_task.id).update(is_completed=True, updated_at=self.now)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.scheduler.refill(self.now + timedelta(minutes=1))
+        selects = [query['sql'] for query in queries.captured_queries if query['sql'].startswith('SELECT')]
+        self.assertEqual(len(selects), 2)
+        self.assertIn('"updated_at" >=', selects[0])
+        self.assertIn('"deadline" >=', selects[1])  # только новая часть окна
+        self.assertEqual(len(self.scheduler), 2)  # напоминание и просрочка Later
+
+        self.scheduler.run_pending(self.now + timedelta(minutes=2))
+        self.scheduler.run_pending(self.now + timedelta(minutes=31))
+        self.assertEqual(self.events, [('reminder', 'Later'), ('overdue', 'Later')])
+
+    def test_run_forever_closes_stale_connections(self):
+        calls = []
+
+        def run_pending():
+            calls.append(len(calls))
+            if len(calls) == 1:
+                self.scheduler.loaded_until = self.now
+                raise DatabaseError('connection lost')
+            self.scheduler.stop()
+
+        with mock.patch('apps.tasks.scheduler.close_old_connections') as close, \
+                mock.patch.object(self.scheduler, 'run_pending', run_pending), \
+                mock.patch.object(self.scheduler, 'seconds_until_next', return_value=0):
+            self.scheduler.run_forever()
+        self.assertEqual(close.call_count, 2)
+        self.assertIsNone(self.scheduler.loaded_until)  # после ошибки окно читается заново
+
+
+class CommentThreadTests(APITestCase):
+    """
+    Тесты для ответов на комментарии
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpass')
+        self.task = Task.objects.create(title='Task', created_by=self.user)
+        self.other_task = Task.objects.create(title='Other Task', created_by=self.user)
+        self.first = Comment.objects.create(task=self.task, author=self.user, content='first')
+        self.second = Comment.objects.create(task=self.task, author=self.user, content='second')
+        self.reply = Comment.objects.create(task=self.task, author=self.user, content='reply', parent=self.first)
+        self.nested = Comment.objects.create(task=self.task, author=self.user, content='nested', parent=self.reply)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(self.user).access_token}')
+
+    def test_thread_order_and_query_count(self):
+        with self.assertNumQueries(4):  # пользователь, задача, страница веток, диапазон путей
+            response = self.client.get(f'/tasks/{self.task.id}/thread/')
+        self.assertEqual([comment['content'] for comment in response.data], ['first', 'reply', 'nested', 'second'])
+        self.assertEqual([comment['depth'] for comment in response.data], [0, 1, 2, 0])
+
+    def test_thread_pagination_and_subtree(self):
+        response = self.client.get(f'/tasks/{self.task.id}/thread/', {'offset': 1, 'limit': 1})
+        self.assertEqual([comment['content'] for comment in response.data], ['second'])
+        response = self.client.get(f'/tasks/{self.task.id}/thread/', {'root': self.first.id, 'max_depth': 1})
+        self.assertEqual([comment['content'] for comment in response.data], ['first', 'reply'])
+
+    def test_thread_rejects_negative_paging(self):
+        for params in ({'offset': -1}, {'limit': -1}, {'limit': 0}, {'max_depth': -1}):
+            response = self.client.get(f'/tasks/{self.task.id}/thread/', params)
+            self.assertEqual(response.status_code, 400, params)
+
+    def test_import_limits_depth(self):
+        comments = [{'id': 1, 'author': 'testuser', 'content': 'root'}]
+        comments += [{'id': i, 'parent': i - 1, 'author': 'testuser', 'content': f'reply {i}'} for i in range(2, 6)]
+        with self.settings(COMMENT_MAX_DEPTH=2):
+            TaskImporter().run([{'title': 'Deep', 'created_by': 'testuser', 'comments': comments}])
+        depths = list(Comment.objects.filter(task__title='Deep').order_by('id').values_list('depth', flat=True))
+        self.assertEqual(depths, [0, 1, 2, 2, 2])
+
+    def test_reply_through_api(self):
+        response = self.client.post('/comments/', {'task_id': self.task.id, 'parent': self.nested.id,
+                                                   'content': 'deep reply'})
+        self.assertEqual(response.status_code, 201)
+        comment = Comment.objects.get(id=response.data['id'])
+        self.assertEqual(comment.depth, 3)
+        self.assertTrue(comment.path.startswith(self.nested.path + '.'))
+
+    def test_reply_to_comment_of_other_task(self):
+        response = self.client.post('/comments/', {'task_id': self.other_task.id, 'parent': self.first.id,
+                                                   'content': 'wrong task'})
+        self.assertEqual(response.status_code, 400)
+
+
+class TaskBatchLoadingTests(APITestCase):
+    """
+    Тесты для пакетной загрузки пользователей и получения нескольких задач по id
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpass')
+        self.assignee = User.objects.create_user(username='assignee', password='testpass')
+        self.tasks = [Task.objects.create(title=f'Task {i}', created_by=self.user, assigned_to=self.assignee)
+                      for i in range(3)]
+        self.foreign_task = Task.objects.create(title='Foreign', created_by=self.assignee)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(self.user).access_token}')
+
+    def test_user_loader_single_query(self):
+        loader = UserLoader()
+        loader.prime(ids=[self.user.id], usernames=['assignee', 'missing'])
+        with self.assertNumQueries(1):
+            self.assertEqual(loader.get_by_id(self.user.id), self.user)
+            self.assertEqual(loader.get_by_username('assignee'), self.assignee)
+            self.assertIsNone(loader.get_by_username('missing'))
+
+    def test_assign_to_self_without_user_lookup(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post('/tasks/', {'title': 'Mine', 'assigned_to': self.user.id})
+        self.assertEqual(response.status_code, 201)
+        # Пользователь загружается только один раз - из токена
+        self.assertEqual(sum('FROM "auth_user"' in query['sql'] for query in queries), 1)
+        response = self.client.patch(f'/tasks/{self.tasks[0].id}/', {'assigned_to': 0})
+        self.assertEqual(response.status_code, 400)
+
+    def test_assign_rejects_bool_and_fraction(self):
+        for value in (True, 1.5):
+            response = self.client.patch(f'/tasks/{self.tasks[0].id}/', {'assigned_to': value}, format='json')
+            self.assertEqual(response.status_code, 400, value)
+        self.assertEqual(Task.objects.get(id=self.tasks[0].id).assigned_to, self.assignee)
+
+    def test_multi_get(self):
+        ids = [self.tasks[0].id, self.tasks[2].id, self.foreign_task.id]
+        with self.assertNumQueries(4):  # пользователь, задачи, комментарии, файлы
+            response = self.client.get('/tasks/', {'ids': ','.join(map(str, ids))})
+        self.assertEqual(sorted(task['id'] for task in response.data), ids[:2])
+
+    def test_multi_get_limit(self):
+        with self.settings(TASK_MULTI_GET_MAX_IDS=2):
+            response = self.client.get('/tasks/', {'ids': '1,2,3'})
+        self.assertEqual(response.status_code, 400)
+
+
+class TaskActivityTests(APITestCase):
+    """
+    Тесты для журнала активности задачи
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpass')
+        self.assignee = User.objects.create_user(username='assignee', password='testpass')
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(self.user).access_token}')
+
+    def tearDown(self):
+        activity_buffer.flush()
+
+    def test_task_changes_recorded(self):
+        with self.settings(ACTIVITY_FLUSH_SIZE=100, ACTIVITY_FLUSH_INTERVAL=3600):
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post('/tasks/', {'title': 'Task', 'assigned_to': self.assignee.id})
+            task_id = response.data['id']
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.patch(f'/tasks/{task_id}/', {'title': 'Renamed', 'assigned_to': self.assignee.id})
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.post('/comments/', {'task_id': task_id, 'content': 'Comment'})
+            # События ждут в буфере до чтения журнала
+            self.assertFalse(TaskActivity.objects.exists())
+
+        response = self.client.get(f'/tasks/{task_id}/activity/')
+        self.assertEqual(response.status_code, 200)
+        comment, update, create = response.data['results']
+        self.assertEqual((comment['object_type'], comment['action']), ('comment', 'created'))
+        self.assertEqual(update['changes'], {'title': ['Task', 'Renamed']})
+        self.assertEqual(create['changes']['assigned_to'], [None, self.assignee.id])
+        self.assertIsNone(response.data['next'])
+
+    def test_diff_does_not_load_old_assignee(self):
+        task = Task.objects.create(title='Task', created_by=self.user, assigned_to=self.user)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.patch(f'/tasks/{task.id}/', {'assigned_to': self.assignee.id})
+        self.assertEqual(response.status_code, 200)
+        # Пользователь из токена и новый исполнитель через UserLoader, прежний исполнитель не загружается
+        self.assertEqual(sum('FROM "auth_user"' in query['sql'] for query in queries), 2)
+
+    def test_keyset_pagination(self):
+        task = Task.objects.create(title='Task', created_by=self.user)
+        TaskActivity.objects.bulk_create([
+            TaskActivity(task_id=task.id, object_type=TaskActivity.TASK, object_id=task.id,
+                         action=TaskActivity.UPDATED, changes={'title': [str(i), str(i + 1)]})
+            for i in range(5)
+        ])
+        response = self.client.get(f'/tasks/{task.id}/activity/', {'limit': 3})
+        first_page = [event['id'] for event in response.data['results']]
+        response = self.client.get(f'/tasks/{task.id}/activity/', {'limit': 3, 'before': response.data['next']})
+        second_page = [event['id'] for event in response.data['results']]
+        self.assertEqual(first_page + second_page, sorted(first_page + second_page, reverse=True))
+        self.assertEqual(len(set(first_page + second_page)), 5)
+        self.assertIsNone(response.data['next'])
+
+    def test_flush_by_size(self):
+        task = Task.objects.create(title='Task', created_by=self.user)
+        with self.settings(ACTIVITY_FLUSH_SIZE=2, ACTIVITY_FLUSH_INTERVAL=3600):
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.patch(f'/tasks/{task.id}/', {'title': 'One'})
+            self.assertEqual(TaskActivity.objects.count(), 0)
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.delete(f'/tasks/{task.id}/')
+            self.assertEqual(TaskActivity.objects.count(), 2)
+        self.assertEqual(TaskActivity.objects.latest('id').action, TaskActivity.DELETED)
+
+    def test_timer_flushes_idle_buffer(self):
+        task = Task.objects.create(title='Task', created_by=self.user)
+        buffer = ActivityBuffer()
+        with self.settings(ACTIVITY_FLUSH_SIZE=100, ACTIVITY_FLUSH_INTERVAL=60), \
+                mock.patch('apps.tasks.activity.threading.Thread') as thread:
+            for _ in range(2):
+                buffer.add(TaskActivity(task_id=task.id, object_type=TaskActivity.TASK, object_id=task.id,
+                                        action=TaskActivity.UPDATED, created_at=timezone.now()))
+            thread.assert_called_once()  # один таймер на процесс
+            self.assertGreater(buffer.tick(), 0)
+            self.assertFalse(TaskActivity.objects.exists())
+            # Новых событий и запросов нет, срок истек
+            buffer.first_added_at -= 60
+            self.assertEqual(buffer.tick(), 60)
+        self.assertEqual(TaskActivity.objects.count(), 2)
+
+
+class TaskVersionTests(APITestCase):
+    """
+    Тесты для оптимистичной блокировки задач по версии
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpass')
+        self.task = Task.objects.create(title='Task', description='Description', created_by=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(self.user).access_token}')
+
+    def test_etag_and_version_increment(self):
+        response = self.client.get(f'/tasks/{self.task.id}/')
+        self.assertEqual(response['ETag'], '"1"')
+        response = self.client.patch(f'/tasks/{self.task.id}/', {'is_completed': True}, HTTP_IF_MATCH='"1"')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['ETag'], '"2"')
+        self.assertEqual(Task.objects.get(id=self.task.id).version, 2)
+
+    def test_stale_version_conflict(self):
+        self.client.patch(f'/tasks/{self.task.id}/', {'title': 'First'}, HTTP_IF_MATCH='"1"')
+        response = self.client.patch(f'/tasks/{self.task.id}/', {'is_completed': True}, HTTP_IF_MATCH='"1"')
+        self.assertEqual(response.status_code, 412)
+        response = self.client.patch(f'/tasks/{self.task.id}/', {'is_completed': True, 'version': 1})
+        self.assertEqual(response.status_code, 412)
+        task = Task.objects.get(id=self.task.id)
+        self.assertEqual((task.title, task.is_completed, task.version), ('First', False, 2))
+
+    def test_if_match_ignored_on_read(self):
+        response = self.client.get('/tasks/', HTTP_IF_MATCH='garbage')
+        self.assertEqual(response.status_code, 200)
+
+    def test_conditional_delete(self):
+        response = self.client.delete(f'/tasks/{self.task.id}/', HTTP_IF_MATCH='"99"')
+        self.assertEqual(response.status_code, 412)
+        self.assertTrue(Task.objects.filter(id=self.task.id).exists())
+        response = self.client.delete(f'/tasks/{self.task.id}/', HTTP_IF_MATCH='"1"')
+        self.assertEqual(response.status_code, 204)
+        self.assertFalse(Task.objects.filter(id=self.task.id).exists())
+
+    def test_only_changed_columns_written(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.patch(f'/tasks/{self.task.id}/', {'title': 'Renamed', 'description': 'Description'})
+        self.assertEqual(response.status_code, 200)
+        update_sql = next(query['sql'] for query in queries if query['sql'].startswith('UPDATE'))
+        set_clause = update_sql.split(' SET ')[1].split(' WHERE ')[0]
+        self.assertIn('"title"', set_clause)
+        self.assertNotIn('"description"', set_clause)
+        self.assertNotIn('"created_at"', set_clause)
+        self.assertIn('"version"', update_sql.split(' WHERE ')[1])
+
+
+class TaskStatsTests(APITestCase):
+    """
+    Тесты для инкрементальных агрегатов статистики по задачам
+    """
+
+    def setUp(self):
+        self.admin = User.objects.create_user(username='admin', password='testpass', is_staff=True)
+        self.assignee = User.objects.create_user(username='assignee', password='testpass')
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(self.admin).access_token}')
+        rebuild_rollups()  # агрегаты по задачам из начальных данных
+
+    def rollups(self):
+        stats = {
+            (row['day'], row['assignee_id']): tuple(row[field] for field in STATS_FIELDS)
+            for row in TaskDailyStats.objects.values('day', 'assignee_id').annotate(
+                **{field: Sum(field) for field in STATS_FIELDS})
+        }
+        buckets = {
+            (row['day'], row['assignee_id'], row['bucket']): row['count']
+            for row in TaskLatencyBucket.objects.values('day', 'assignee_id', 'bucket').annotate(count=Sum('count'))
+        }
+        return ({key: values for key, values in stats.items() if any(values)},
+                {key: count for key, count in buckets.items() if count})
+
+    def create_task(self, **data):
+        response = self.client.post('/tasks/', {'title': 'Task', 'assigned_to': self.assignee.id, **data})
+        self.assertEqual(response.status_code, 201)
+        return response.data['id']
+
+    def update_task(self, task_id, **data):
+        response = self.client.patch(f'/tasks/{task_id}/', data)
+        self.assertEqual(response.status_code, 200)
+
+    def test_rollups_match_recomputation(self):
+        yesterday = (timezone.now() - timedelta(days=1)).isoformat()
+        late = self.create_task(deadline=yesterday)
+        reassigned = self.create_task()
+        deleted = self.create_task(is_completed=True)
+        self.update_task(late, is_completed=True)
+        self.update_task(reassigned, is_completed=True)
+        self.update_task(reassigned, assigned_to=self.admin.id)
+        self.update_task(reassigned, is_completed=False)
+        self.update_task(reassigned, is_completed=True, deadline=yesterday)
+        self.update_task(late, deadline=(timezone.now() + timedelta(days=1)).isoformat())
+        self.client.delete(f'/tasks/{deleted}/')
+        TaskImporter().run([{'title': 'Imported', 'created_by': 'admin', 'assigned_to': 'assignee',
+                             'is_completed': True}])
+        archive_completed_tasks(older_than_days=0)
+        self.assertTrue(ArchivedTask.objects.filter(id=late).exists())
+        # Задачи удаленного пользователя удаляются каскадно, назначенные ему остаются без исполнителя
+        author = User.objects.create_user(username='author', password='testpass')
+        TaskImporter().run([{'title': 'By author', 'created_by': 'author', 'assigned_to': 'assignee'}])
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(author).access_token}')
+        self.create_task(is_completed=True)
+        author.delete()
+        self.assignee.delete()
+
+        incremental = self.rollups()
+        rebuild_rollups()
+        self.assertEqual(incremental, self.rollups())
+
+    def test_rollups_append_deltas_and_compact(self):
+        task_id = self.create_task()
+        with CaptureQueriesContext(connection) as queries:
+            self.update_task(task_id, is_completed=True)
+        stats_queries = [query['sql'] for query in queries.captured_queries
+                         if 'tasks_taskdailystats' in query['sql'] or 'tasks_tasklatencybucket' in query['sql']]
+        # Без UPDATE общих строк: только вставка дельт
+        self.assertEqual(len(stats_queries), 2)
+        self.assertTrue(all(sql.startswith('INSERT') for sql in stats_queries))
+        self.update_task(task_id, is_completed=False)
+
+        expected = self.rollups()
+        rows = TaskDailyStats.objects.count() + TaskLatencyBucket.objects.count()
+        out = StringIO()
+        call_command('backfill_task_stats', '--compact', stdout=out)
+        self.assertEqual(self.rollups(), expected)
+        compacted = TaskDailyStats.objects.count() + TaskLatencyBucket.objects.count()
+        self.assertLess(compacted, rows)
+        self.assertIn(f'from {rows} to {compacted} rows', out.getvalue())
+
+    def test_stats_endpoint(self):
+        task_id = self.create_task(deadline=(timezone.now() - timedelta(days=1)).isoformat())
+        self.create_task()
+        self.update_task(task_id, is_completed=True)
+
+        with self.assertNumQueries(7):  # пользователь, исполнитель, гистограмма, исполнители, их имена, итоги, дни
+            response = self.client.get('/tasks/stats/', {'assigned_to': 'assignee'})
+        self.assertEqual(response.status_code, 200)
+        totals = response.data['totals']
+        self.assertEqual((totals['created'], totals['completed'], totals['completed_late']), (2, 1, 1))
+        self.assertEqual(totals['overdue_rate'], 1.0)
+        self.assertEqual(totals['median_completion_seconds'], 60)
+        self.assertEqual(response.data['assignees'][0]['assigned_to'], 'assignee')
+
+        for params in ({'date_from': 'yesterday'}, {'date_from': '2024-10-02', 'date_to': '2024-10-01'},
+                       {'assigned_to': 'missing'}):
+            response = self.client.get('/tasks/stats/', params)
+            self.assertEqual(response.status_code, 400, params)
+        self.client.credentials(
+            HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(self.assignee).access_token}')
+        self.assertEqual(self.client.get('/tasks/stats/').status_code, 403)
+
+
+class WarmupTests(APITestCase):
+    """
+    Тесты для прогрева приложения перед запуском воркеров
+    """
+
+    def test_serializers_warmed(self):
+        callbacks = warm_urls()
+        self.assertIn(TaskViewSet, [getattr(callback, 'cls', None) for callback in callbacks])
+        # Сериализаторы задач, комментариев, регистрации и токенов
+        self.assertGreaterEqual(warm_serializers(callbacks), 5)
@@ -1,17 +1,91 @@
+import heapq
+import io
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.http import Http404, StreamingHttpResponse
+from django.utils import timezone
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import viewsets, permissions, status
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.generics import get_object_or_404
 from rest_framework.parsers import MultiPartParser, FormParser
 from rest_framework.response import Response
 
 from apps.tasks.permissions import IsOwnerOrAssignee
-from .models import Task, Comment, TaskFile
-from .serializers import TaskSerializer, TaskCreateUpdateSerializer, CommentSerializer
+from .activity import activity_buffer, record_activity
+from .exceptions import PreconditionFailed
+from .export import EXPORT_FORMATS, iter_export, get_content_type
+from .filters import TaskFilter, ArchivedTaskFilter
+from .importer import IMPORT_FORMATS, TaskImporter, iter_records
+from .loaders import UserLoader, collect_values
+from .models import Task, Comment, TaskFile, ArchivedTask, TaskActivity, visibility_q
+from .parsers import get_parser_classes
+from .renderers import NDJSONExportRenderer, CSVExportRenderer, get_renderer_classes
+from .rollups import get_stats, record_task_change, task_state
+from .serializers import (TaskSerializer, TaskCreateUpdateSerializer, CommentSerializer, ArchivedTaskSerializer,
+                          TaskValuesSerializer, TaskActivitySerializer)
 
 
 MAX_FILE_SIZE = 5 * 1024 * 1024  # 5 MB
 
 
+def make_etag(version):
+    return f'"{version}"'
+
+
+def parse_etag(value):
+    """
+    Версия задачи из заголовка If-Match: "3", W/"3" или 3. Для * проверка версии не нужна.
+    """
+    value = value.strip()
+    if value == '*':
+        return None
+    if value.startswith('W/'):
+        value = value[2:]
+    try:
+        return int(value.strip('"'))
+    except ValueError:
+        raise PreconditionFailed()
+
+
+class MergedTaskList:
+    """
+    Основные и архивные задачи одной последовательностью пар (архивная, id) в порядке (дедлайн, id).
+    Срез [start:stop] читает из каждой таблицы не больше stop строк, поэтому страница списка
+    не зависит от размера архива. Задачи без дедлайна идут там же, где их ставит ORDER BY базы данных.
+    """
+
+    def __init__(self, tasks, archived_tasks):
+        self.tasks = tasks.order_by('deadline', 'id').values_list('deadline', 'id')
+        self.archived_tasks = archived_tasks.prefetch_related(None).order_by('deadline', 'id').values_list(
+            'deadline', 'id')
+
+    def count(self):
+        return self.tasks.count() + self.archived_tasks.count()
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            raise TypeError('MergedTaskList supports only slices')
+        tasks, archived_tasks = self.tasks, self.archived_tasks
+        if index.stop is not None:
+            tasks, archived_tasks = tasks[:index.stop], archived_tasks[:index.stop]
+        nulls_last = connection.features.nulls_order_largest
+
+        def key(item):
+            deadline, task_id = item[0]
+            return (deadline is None) == nulls_last, deadline, task_id
+
+        merged = heapq.merge(((row, False) for row in tasks), ((row, True) for row in archived_tasks), key=key)
+        return [(archived, row[1]) for row, archived in merged][index]
+
+
 class TaskViewSet(viewsets.ModelViewSet):
     """
 
@@ -19,14 +93,64 @@ class TaskViewSet(viewsets.ModelViewSet):
     queryset = Task.objects.all()
     permission_classes = [permissions.IsAuthenticated, IsOwnerOrAssignee]
     filter_backends = [DjangoFilterBackend]
+    filterset_class = TaskFilter
+    renderer_classes = get_renderer_classes()
+    parser_classes = get_parser_classes()
+
+    user_loader = None
 
     def get_serializer_class(self):
         if self.action in ['create', 'update', 'partial_update']:
             return TaskCreateUpdateSerializer
         return TaskSerializer
 
+    def get_user_loader(self):
+        """
+        Загрузчик пользователей на время запроса: текущий пользователь уже известен,
+        остальные пользователи из тела запроса загружаются одним запросом
+        """
+        if self.user_loader is None:
+            user = self.request.user
+            self.user_loader = UserLoader([user] if user.is_authenticated else [])
+            if self.request.method not in permissions.SAFE_METHODS:
+                self.user_loader.prime(ids=collect_values(self.request.data, 'assigned_to'))
+        return self.user_loader
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        if self.request is not None:
+            context['user_loader'] = self.get_user_loader()
+            context['expected_version'] = self.get_expected_version()
+        return context
+
+    def get_expected_version(self):
+        """
+        Версия из заголовка If-Match. Учитывается только при изменении и удалении задачи.
+        """
+        if self.action not in ('update', 'partial_update', 'destroy') or 'If-Match' not in self.request.headers:
+            return None
+        return parse_etag(self.request.headers['If-Match'])
+
     def perform_create(self, serializer):
-        serializer.save(created_by=self.request.user)
+        with transaction.atomic():
+            serializer.save(created_by=self.request.user)
+
+    def perform_update(self, serializer):
+        # Задача и агрегаты статистики изменяются в одной транзакции
+        with transaction.atomic():
+            serializer.save()
+
+    def perform_destroy(self, instance):
+        # Удаление условное, как и изменение: задача удаляется, только если ее версия не изменилась
+        expected_version = self.get_expected_version()
+        if expected_version is None:
+            expected_version = instance.version
+        with transaction.atomic():
+            deleted, per_model = Task.objects.filter(pk=instance.pk, version=expected_version).delete()
+            if not per_model.get(Task._meta.label):
+                raise PreconditionFailed()
+            record_task_change(task_state(instance), None)
+        record_activity(instance.id, self.request.user, TaskActivity.TASK, instance.id, TaskActivity.DELETED)
 
     @action(detail=True, methods=['post'], parser_classes=[MultiPartParser, FormParser])
     def upload_files(self, request, pk=None):
@@ -38,13 +162,219 @@ class TaskViewSet(viewsets.ModelViewSet):
                     {'error': f'File "{file.name}" exceeds the maximum allowed size of 5 MB.'},
                     status=status.HTTP_400_BAD_REQUEST
                 )
-            TaskFile.objects.create(task=task, file=file)
+            task_file = TaskFile.objects.create(task=task, file=file)
+            record_activity(task.id, request.user, TaskActivity.FILE, task_file.id, TaskActivity.CREATED,
+                            {'file': [None, task_file.file.name]})
         return Response({'status': 'files uploaded'}, status=status.HTTP_201_CREATED)
 
+    @action(detail=True, methods=['get'])
+    def thread(self, request, pk=None):
+        """
+        Комментарии задачи деревом в порядке отображения: root - поддерево комментария,
+        max_depth - глубина относительно корня, offset и limit - страница веток верхнего уровня
+        """
+        task = self.get_object()
+        try:
+            max_depth = int(request.query_params['max_depth']) if 'max_depth' in request.query_params else None
+            offset = int(request.query_params.get('offset', 0))
+            limit = int(request.query_params.get('limit', settings.COMMENT_THREADS_PAGE_SIZE))
+        except ValueError:
+            return Response({'error': 'max_depth, offset and limit must be integers.'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        if offset < 0 or limit < 1 or (max_depth is not None and max_depth < 0):
+            return Response({'error': 'max_depth and offset must not be negative, limit must be positive.'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        limit = min(limit, settings.COMMENT_THREADS_MAX_PAGE_SIZE)
+        comments = Comment.objects.select_related('author')
+        root_id = request.query_params.get('root')
+        if root_id:
+            root = get_object_or_404(Comment.objects.all(), pk=root_id, task_id=task.id)
+            queryset = comments.subtree(root, None if max_depth is None else root.depth + max_depth)
+        else:
+            # Одним запросом выбираем страницу веток верхнего уровня, вторым - все ответы в их диапазоне путей
+            roots = list(
+                Comment.objects.filter(task_id=task.id, depth=0).order_by('path')
+                .values_list('path', flat=True)[offset:offset + limit]
+            )
+            if not roots:
+                return Response([])
+            queryset = comments.path_range(task.id, roots[0], roots[-1], max_depth)
+        return Response(CommentSerializer(queryset, many=True).data)
+
+    @action(detail=True, methods=['get'])
+    def activity(self, request, pk=None):
+        """
+        Журнал активности задачи от новых событий к старым. Страницы по ключу:
+        before - id последнего события предыдущей страницы (поле next ответа), limit - размер страницы
+        """
+        task = self.get_object()
+        try:
+            before = int(request.query_params['before']) if 'before' in request.query_params else None
+            limit = int(request.query_params.get('limit', settings.ACTIVITY_PAGE_SIZE))
+        except ValueError:
+            return Response({'error': 'before and limit must be integers.'}, status=status.HTTP_400_BAD_REQUEST)
+        limit = max(1, min(limit, settings.ACTIVITY_MAX_PAGE_SIZE))
+        # События из буфера этого процесса записываются до чтения. События, накопленные другими воркерами,
+        # появляются в журнале не позже чем через ACTIVITY_FLUSH_INTERVAL
+        activity_buffer.flush()
+        queryset = TaskActivity.objects.filter(task_id=task.id).order_by('-id')
+        if before is not None:
+            queryset = queryset.filter(id__lt=before)
+        events = list(queryset[:limit])
+        return Response({
+            'results': TaskActivitySerializer(events, many=True).data,
+            'next': events[-1].id if len(events) == limit else None,
+        })
+
+    @action(detail=False, methods=['get'], permission_classes=[permissions.IsAdminUser])
+    def stats(self, request):
+        """
+        Статистика по задачам за период из агрегатов: создано, выполнено, выполнено с опозданием,
+        среднее и медианное время выполнения по дням и исполнителям.
+        Параметры: date_from, date_to (YYYY-MM-DD), assigned_to (имя исполнителя, как в фильтре задач).
+        """
+        try:
+            date_to = (date.fromisoformat(request.query_params['date_to']) if 'date_to' in request.query_params
+                       else timezone.localdate())
+            date_from = (date.fromisoformat(request.query_params['date_from']) if 'date_from' in request.query_params
+                         else date_to - timedelta(days=settings.TASK_STATS_DEFAULT_DAYS - 1))
+        except ValueError:
+            return Response({'error': 'date_from and date_to must be dates (YYYY-MM-DD).'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        if date_from > date_to:
+            return Response({'error': 'date_from must not be later than date_to.'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        assignee_id = None
+        if request.query_params.get('assigned_to'):
+            username = request.query_params['assigned_to']
+            assignee_id = User.objects.filter(username=username).values_list('id', flat=True).first()
+            if assignee_id is None:
+                return Response({'error': f'User "{username}" does not exist.'}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(get_stats(date_from, date_to, assignee_id))
+
+    @action(detail=False, methods=['get'],
+            renderer_classes=get_renderer_classes() + [NDJSONExportRenderer, CSVExportRenderer])
+    def export(self, request):
+        """
+        Потоковая выгрузка задач с комментариями и файлами в NDJSON или CSV с учетом фильтров.
+        Формат задается параметром export_format или заголовком Accept, по умолчанию - NDJSON.
+        """
+        accepted_format = getattr(request.accepted_renderer, 'format', None)
+        default_format = accepted_format if accepted_format in EXPORT_FORMATS else 'ndjson'
+        export_format = request.query_params.get('export_format', default_format)
+        if export_format not in EXPORT_FORMATS:
+            return Response(
+                {'error': f'Unsupported export format "{export_format}". Use one of: {", ".join(EXPORT_FORMATS)}.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        queryset = self.filter_queryset(self.get_queryset())
+        response = StreamingHttpResponse(iter_export(queryset, export_format),
+                                         content_type=get_content_type(export_format))
+        response['Content-Disposition'] = f'attachment; filename="tasks.{export_format}"'
+        return response
+
+    @action(detail=False, methods=['post'], url_path='import', parser_classes=[MultiPartParser, FormParser],
+            permission_classes=[permissions.IsAdminUser])
+    def import_tasks(self, request):
+        """
+        Пакетный импорт задач с комментариями из файла NDJSON или CSV.
+        Параметр start позволяет продолжить прерванный импорт с номера записи из ответа.
+        """
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({'error': 'File is required.'}, status=status.HTTP_400_BAD_REQUEST)
+        import_format = request.data.get('import_format') or ('csv' if upload.name.endswith('.csv') else 'ndjson')
+        if import_format not in IMPORT_FORMATS:
+            return Response(
+                {'error': f'Unsupported import format "{import_format}". Use one of: {", ".join(IMPORT_FORMATS)}.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            start = int(request.data.get('start') or 0)
+        except ValueError:
+            return Response({'error': 'start must be an integer.'}, status=status.HTTP_400_BAD_REQUEST)
+        importer = TaskImporter(default_created_by=request.user.username)
+        lines = io.TextIOWrapper(upload.file, encoding='utf-8', newline='')
+        try:
+            result = importer.run(iter_records(lines, import_format), start=start)
+        except ValueError as exc:
+            # Предыдущие пачки уже сохранены, импорт продолжается с processed
+            return Response({'error': str(exc), 'processed': importer.processed,
+                             'imported_tasks': importer.imported_tasks}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(result, status=status.HTTP_201_CREATED)
+
     def get_queryset(self):
         queryset = super().get_queryset().order_by('deadline')  # Сортировка по дедлайну
+        if getattr(self, 'swagger_fake_view', False):
+            return queryset  # при генерации схемы API пользователя нет
+        # Чтение ограничено видимыми задачами прямо в запросе. Для изменения задача ищется среди всех,
+        # чтобы постороннему пользователю IsOwnerOrAssignee вернул 403
+        if self.request.method in permissions.SAFE_METHODS:
+            queryset = queryset.visible_to(self.request.user)
+        if self.action == 'retrieve':
+            queryset = queryset.with_related()
         return queryset
 
+    def include_archived(self):
+        value = self.request.query_params.get('include_archived', '')
+        return value.lower() in ('1', 'true', 'yes')
+
+    def get_archived_queryset(self):
+        return ArchivedTask.objects.visible_to(self.request.user).select_related(
+            'created_by', 'assigned_to'
+        ).prefetch_related('comments__author', 'files').order_by('deadline')
+
+    def list(self, request, *args, **kwargs):
+        # Архивные задачи добавляются в выдачу только по явному запросу
+        if self.include_archived():
+            return self.list_with_archived(request)
+        if self.paginator is not None:
+            return super().list(request, *args, **kwargs)
+        queryset = self.filter_queryset(self.get_queryset())
+        # Список только читается, поэтому строим ответ напрямую из values() без TaskSerializer
+        return Response(TaskValuesSerializer(queryset, context=self.get_serializer_context()).data)
+
+    def list_with_archived(self, request):
+        """
+        Основные и архивные задачи одним списком в порядке дедлайна. Сливаются только пары (дедлайн, id)
+        в пределах текущей страницы, сериализуются задачи этой страницы.
+        """
+        queryset = self.filter_queryset(self.get_queryset())
+        archived_queryset = ArchivedTaskFilter(request.query_params, queryset=self.get_archived_queryset(),
+                                               request=request).qs
+        rows = MergedTaskList(queryset, archived_queryset)
+        page = self.paginate_queryset(rows) if self.paginator is not None else rows[:]
+        context = self.get_serializer_context()
+        task_ids = [task_id for archived, task_id in page if not archived]
+        archived_ids = [task_id for archived, task_id in page if archived]
+        tasks = {task['id']: task for task in TaskValuesSerializer(queryset.filter(id__in=task_ids),
+                                                                       context=context).data}
+        archived_tasks = {task['id']: task for task in ArchivedTaskSerializer(
+            archived_queryset.filter(id__in=archived_ids), many=True, context=context).data}
+        # Задача могла быть перенесена в архив или удалена между запросами
+        data = [task for task in ((archived_tasks if archived else tasks).get(task_id) for archived, task_id in page)
+                if task is not None]
+        if self.paginator is not None:
+            return self.get_paginated_response(data)
+        return Response(data)
+
+    def update(self, request, *args, **kwargs):
+        response = super().update(request, *args, **kwargs)
+        response['ETag'] = make_etag(response.data['version'])
+        return response
+
+    def retrieve(self, request, *args, **kwargs):
+        try:
+            response = super().retrieve(request, *args, **kwargs)
+            response['ETag'] = make_etag(response.data['version'])
+            return response
+        except Http404:
+            if not self.include_archived():
+                raise
+        archived = get_object_or_404(self.get_archived_queryset(), pk=kwargs[self.lookup_field])
+        self.check_object_permissions(request, archived)
+        return Response(ArchivedTaskSerializer(archived, context=self.get_serializer_context()).data)
+
 
 class CommentViewSet(viewsets.ModelViewSet):
     """
@@ -53,7 +383,24 @@ class CommentViewSet(viewsets.ModelViewSet):
     queryset = Comment.objects.all()
     serializer_class = CommentSerializer
     permission_classes = [permissions.IsAuthenticated]
+    renderer_classes = get_renderer_classes()
+    parser_classes = get_parser_classes()
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if getattr(self, 'swagger_fake_view', False):
+            return queryset
+        # Комментарии доступны только по видимым пользователю задачам
+        return queryset.filter(visibility_q(self.request.user, prefix='task__'))
 
     def perform_create(self, serializer):
-        task = Task.objects.get(id=self.request.data.get('task_id'))
+        task_id = self.request.data.get('task_id')
+        if task_id in (None, ''):
+            raise ValidationError({'task_id': ['This field is required.']})
+        # Комментировать можно только видимые пользователю задачи, для остальных ответ 404
+        task = get_object_or_404(Task.objects.visible_to(self.request.user), id=task_id)
         serializer.save(author=self.request.user, task=task)
+
+    def perform_destroy(self, instance):
+        record_activity(instance.task_id, self.request.user, TaskActivity.COMMENT, instance.id, TaskActivity.DELETED)
+        instance.delete()
@@ -0,0 +1,132 @@
+"""
+Холодный старт воркеров: загрузка приложения в главном процессе, fork воркеров как у gunicorn
+с preload_app и первый запрос GET /tasks/{id}/ в каждом воркере. Сравнивается запуск
+с прогревом (DJANGO_WARMUP=1) и без него. Для каждого воркера замеряются время от fork
+до ответа на первый запрос и память: RSS, PSS и собственные (не общие с главным процессом) страницы.
+
+    python benchmarks/bench_cold_start.py --workers 4 --repeat 5
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SETTINGS = """
+from smarteducation.settings import *  # noqa: F401,F403
+
+DATABASES['default']['NAME'] = {name!r}
+"""
+
+PREPARE_SCRIPT = """
+import django
+django.setup()
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from rest_framework_simplejwt.tokens import RefreshToken
+from apps.tasks.models import Task, Comment
+
+call_command('migrate', verbosity=0)
+user = User.objects.create_user(username='bench_author', password='bench')
+task = Task.objects.create(title='Task', description='Description', created_by=user, assigned_to=user)
+Comment.objects.create(task=task, author=user, content='Comment')
+print(task.id, RefreshToken.for_user(user).access_token)
+"""
+
+WORKER_SCRIPT = """
+import json, os, sys, time
+from wsgiref.util import setup_testing_defaults
+
+task_id, token, workers = sys.argv[1], sys.argv[2], int(sys.argv[3])
+started = time.perf_counter()
+from smarteducation.wsgi import application
+boot = time.perf_counter() - started
+
+
+def memory():
+    values = {}
+    with open('/proc/self/smaps_rollup') as smaps:
+        for line in smaps:
+            name, _, rest = line.partition(':')
+            if name in ('Rss', 'Pss', 'Private_Clean', 'Private_Dirty'):
+                values[name] = int(rest.split()[0])
+    return values
+
+
+def first_request():
+    environ = {}
+    setup_testing_defaults(environ)
+    environ.update(REQUEST_METHOD='GET', PATH_INFO=f'/tasks/{task_id}/', HTTP_AUTHORIZATION=f'Bearer {token}')
+    statuses = []
+    b''.join(application(environ, lambda status, headers, exc_info=None: statuses.append(status)))
+    assert statuses[0].startswith('200'), statuses[0]
+
+
+results = []
+for _ in range(workers):
+    read_fd, write_fd = os.pipe()
+    forked = time.perf_counter()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read_fd)
+        first_request()
+        first = time.perf_counter() - forked
+        mem = memory()
+        os.write(write_fd, json.dumps({
+            'first_request': first,
+            'rss': mem['Rss'],
+            'pss': mem['Pss'],
+            'private': mem['Private_Clean'] + mem['Private_Dirty'],
+        }).encode())
+        os._exit(0)
+    os.close(write_fd)
+    with os.fdopen(read_fd) as pipe:
+        results.append(json.loads(pipe.read()))
+    os.waitpid(pid, 0)
+print(json.dumps({'boot': boot, 'workers': results}))
+"""
+
+SCENARIOS = [
+    ('without warm-up', '0'),
+    ('with warm-up', '1'),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        with open(os.path.join(tmp_dir, 'bench_settings.py'), 'w') as settings_file:
+            settings_file.write(SETTINGS.format(name=os.path.join(tmp_dir, 'db.sqlite3')))
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE='bench_settings',
+                   PYTHONPATH=os.pathsep.join([tmp_dir, BASE_DIR]))
+        task_id, token = subprocess.run([sys.executable, '-c', PREPARE_SCRIPT], cwd=BASE_DIR, env=env, check=True,
+                                        capture_output=True, text=True).stdout.split()
+
+        print(f'{args.workers} workers, median of {args.repeat} runs')
+        print(f'{"":<18} {"boot":>9} {"1st request":>12} {"boot + 1st":>11} {"RSS":>9} {"PSS":>9} {"private":>9}')
+        for name, warmup in SCENARIOS:
+            runs = []
+            for _ in range(args.repeat):
+                output = subprocess.run(
+                    [sys.executable, '-c', WORKER_SCRIPT, task_id, token, str(args.workers)], cwd=BASE_DIR,
+                    env=dict(env, DJANGO_WARMUP=warmup), check=True, capture_output=True, text=True).stdout
+                runs.append(json.loads(output.strip().splitlines()[-1]))
+            workers = [worker for run in runs for worker in run['workers']]
+            boot = statistics.median(run['boot'] for run in runs)
+            first = statistics.median(worker['first_request'] for worker in workers)
+            rss, pss, private = (statistics.median(worker[key] for worker in workers) / 1024
+                                 for key in ('rss', 'pss', 'private'))
+            print(f'{name:<18} {boot * 1000:6.1f} ms {first * 1000:9.1f} ms {(boot + first) * 1000:8.1f} ms '
+                  f'{rss:6.1f} MB {pss:6.1f} MB {private:6.1f} MB')
+
+
+if __name__ == '__main__':
+    main()
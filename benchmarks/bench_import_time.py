@@ -0,0 +1,56 @@
+"""
+Время холодного старта воркера: django.setup(), загрузка urls и построение резолвера.
+Каждый замер выполняется в отдельном процессе.
+
+    python benchmarks/bench_import_time.py --repeat 10
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SCRIPT = """
+import os, sys, time
+started = time.perf_counter()
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'smarteducation.settings')
+import django
+django.setup()
+from django.urls import get_resolver
+get_resolver().url_patterns
+if {eager}:
+    # Прежнее поведение: drf_yasg и schema_view создаются при импорте urls
+    from smarteducation.docs import get_schema_view
+    get_schema_view()
+print(time.perf_counter() - started)
+"""
+
+SCENARIOS = [
+    ('docs disabled', '0', False),
+    ('docs enabled, lazy drf_yasg', '1', False),
+    ('docs enabled, eager drf_yasg', '1', True),
+]
+
+
+def run(docs_enabled, eager):
+    env = dict(os.environ, API_DOCS_ENABLED=docs_enabled)
+    output = subprocess.run([sys.executable, '-c', SCRIPT.format(eager=eager)], cwd=BASE_DIR, env=env,
+                            check=True, capture_output=True, text=True).stdout
+    return float(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeat', type=int, default=10)
+    args = parser.parse_args()
+
+    print(f'median of {args.repeat} runs')
+    for name, docs_enabled, eager in SCENARIOS:
+        timings = [run(docs_enabled, eager) for _ in range(args.repeat)]
+        print(f'{name:<32} {statistics.median(timings) * 1000:8.1f} ms')
+
+
+if __name__ == '__main__':
+    main()
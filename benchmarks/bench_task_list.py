@@ -0,0 +1,76 @@
+"""
+Сравнение сериализации и рендеринга списка задач: TaskSerializer + JSONRenderer
+против TaskValuesSerializer + ORJSONRenderer/MessagePackRenderer.
+
+    python benchmarks/bench_task_list.py --tasks 10000
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.common import setup_django, test_database, measure  # noqa: E402
+
+
+def create_tasks(count):
+    from django.contrib.auth.models import User
+    from django.utils import timezone
+    from apps.tasks.models import Task, Comment
+
+    author = User.objects.create_user(username='bench_author', password='bench')
+    assignee = User.objects.create_user(username='bench_assignee', password='bench')
+    now = timezone.now()
+    tasks = Task.objects.bulk_create([
+        Task(title=f'Task {i}', description='Description ' * 10, created_by=author, assigned_to=assignee,
+             deadline=now)
+        for i in range(count)
+    ], batch_size=1000)
+    Comment.objects.bulk_create([
+        Comment(task=task, author=assignee, content='Comment text')
+        for task in tasks[::2]
+    ], batch_size=1000)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--tasks', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    setup_django()
+    from rest_framework.renderers import JSONRenderer
+    from rest_framework.test import APIRequestFactory
+    from apps.tasks.models import Task
+    from apps.tasks.renderers import ORJSONRenderer, MessagePackRenderer, orjson, msgpack
+    from apps.tasks.serializers import TaskSerializer, TaskValuesSerializer
+
+    with test_database():
+        create_tasks(args.tasks)
+        request = APIRequestFactory().get('/tasks/')
+        context = {'request': request}
+        queryset = Task.objects.order_by('deadline')
+
+        results = {
+            'TaskSerializer': measure(
+                lambda: TaskSerializer(queryset.all(), many=True, context=context).data, args.repeat),
+            'TaskSerializer + prefetch': measure(
+                lambda: TaskSerializer(queryset.select_related('created_by', 'assigned_to').prefetch_related(
+                    'comments__author', 'files'), many=True, context=context).data, args.repeat),
+            'TaskValuesSerializer': measure(
+                lambda: TaskValuesSerializer(queryset.all(), context=context).data, args.repeat),
+        }
+        data = TaskValuesSerializer(queryset.all(), context=context).data
+        results['JSONRenderer'] = measure(lambda: JSONRenderer().render(data), args.repeat)
+        if orjson is not None:
+            results['ORJSONRenderer'] = measure(lambda: ORJSONRenderer().render(data), args.repeat)
+        if msgpack is not None:
+            results['MessagePackRenderer'] = measure(lambda: MessagePackRenderer().render(data), args.repeat)
+
+    print(f'{args.tasks} tasks, best of {args.repeat}')
+    for name, elapsed in results.items():
+        print(f'{name:<28} {elapsed * 1000:10.1f} ms')
+
+
+if __name__ == '__main__':
+    main()
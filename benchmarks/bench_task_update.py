@@ -0,0 +1,91 @@
+"""
+Сравнение частичного изменения задачи: ModelSerializer.update (save() всех колонок)
+против условного UPDATE только измененных полей с проверкой версии.
+Показывает число колонок и байт параметров в UPDATE задачи, число запросов к агрегатам статистики
+на одно изменение (оба варианта их обновляют) и время на серию изменений.
+
+    python benchmarks/bench_task_update.py --updates 1000
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.common import setup_django, test_database, measure  # noqa: E402
+
+
+ROLLUP_TABLES = ('"tasks_taskdailystats"', '"tasks_tasklatencybucket"')
+
+
+def write_stats(queries):
+    """
+    Колонки в SET и размер параметров последнего UPDATE задачи, число запросов к агрегатам статистики
+    """
+    sql = next(query['sql'] for query in reversed(queries) if query['sql'].startswith('UPDATE "tasks_task"'))
+    set_clause = sql.split(' SET ', 1)[1].split(' WHERE ', 1)[0]
+    rollups = sum(any(table in query['sql'] for table in ROLLUP_TABLES) for query in queries)
+    return set_clause.count(' = '), len(set_clause.encode()), rollups
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--updates', type=int, default=1000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.contrib.auth.models import User
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+    from django.utils import timezone
+    from rest_framework import serializers
+    from apps.tasks.models import Task
+    from apps.tasks.rollups import record_task_change, task_state
+    from apps.tasks.serializers import TaskCreateUpdateSerializer
+
+    class SaveAllSerializer(serializers.ModelSerializer):
+        """
+        save() всех колонок с тем же учетом completed_at и агрегатов статистики, что и у условного UPDATE
+        """
+        class Meta:
+            model = Task
+            fields = ['id', 'title', 'description', 'assigned_to', 'is_completed', 'deadline']
+
+        def update(self, instance, validated_data):
+            old_state = task_state(instance)
+            if validated_data.get('is_completed', instance.is_completed) != instance.is_completed:
+                validated_data['completed_at'] = timezone.now() if validated_data['is_completed'] else None
+            instance = super().update(instance, validated_data)
+            record_task_change(old_state, task_state(instance))
+            return instance
+
+    with test_database():
+        user = User.objects.create_user(username='bench_author', password='bench')
+        task = Task.objects.create(title='Task', description='Description ' * 100, created_by=user,
+                                   assigned_to=user, deadline=timezone.now())
+
+        def run(serializer_class):
+            for i in range(args.updates):
+                instance = Task.objects.get(pk=task.pk)
+                serializer = serializer_class(instance, data={'is_completed': i % 2 == 0}, partial=True)
+                serializer.is_valid(raise_exception=True)
+                serializer.save()
+
+        results = {}
+        for name, serializer_class in (('save() all columns', SaveAllSerializer),
+                                       ('conditional UPDATE', TaskCreateUpdateSerializer)):
+            with CaptureQueriesContext(connection) as queries:
+                run(serializer_class)
+            columns, size, rollups = write_stats(queries.captured_queries)
+            results[name] = (columns, size, rollups / args.updates,
+                             measure(lambda: run(serializer_class), args.repeat))
+
+    print(f'{args.updates} partial updates, best of {args.repeat}')
+    print(f'{"":<22} {"columns":>8} {"SET bytes":>10} {"stats queries":>14} {"time":>12}')
+    for name, (columns, size, rollups, elapsed) in results.items():
+        print(f'{name:<22} {columns:>8} {size:>10} {rollups:>14.1f} {elapsed * 1000:9.1f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,28 @@
+"""
+Конфигурация gunicorn для production:
+
+    gunicorn -c gunicorn.conf.py smarteducation.wsgi
+
+Приложение загружается и прогревается в главном процессе (preload_app), воркеры создаются через fork
+и разделяют загруженный код и кеши copy-on-write. Число воркеров задается переменной WEB_CONCURRENCY.
+"""
+import multiprocessing
+import os
+
+os.environ.setdefault('DJANGO_WARMUP', '1')
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8000')
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+preload_app = True
+# Перезапуск воркеров после N запросов ограничивает рост памяти, разброс не дает им перезапуститься одновременно
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 1000))
+max_requests_jitter = max_requests // 10
+timeout = 30
+accesslog = '-'
+
+
+def pre_fork(server, worker):
+    # Соединения с базой, открытые в главном процессе, не должны наследоваться воркерами
+    from django.db import connections
+
+    connections.close_all()
@@ -11,6 +11,12 @@ import os
 
 from django.core.asgi import get_asgi_application
 
+from smarteducation import warmup
+
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'smarteducation.settings')
 
 application = get_asgi_application()
+
+# Прогрев приложения в главном процессе до создания воркеров (см. gunicorn.conf.py)
+if warmup.is_enabled():
+    warmup.warm_up()
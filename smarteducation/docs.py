@@ -0,0 +1,122 @@
+"""
+Документация API (swagger/redoc).
+
+Схема OpenAPI генерируется заранее командой generate_schema и отдается как готовый файл
+(со сжатием gzip, если клиент его поддерживает). drf_yasg импортируется только при первом
+обращении к документации, поэтому не замедляет запуск воркеров.
+"""
+import gzip
+from functools import lru_cache
+from pathlib import Path
+
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.views.decorators.http import require_GET
+
+
+def get_api_info():
+    from drf_yasg import openapi
+
+    return openapi.Info(
+        title="Task Management API",
+        default_version='v1',
+        description="API для системы управления задачами",
+        contact=openapi.Contact(email="support@example.com"),
+        license=openapi.License(name="BSD License"),
+    )
+
+
+@lru_cache(maxsize=None)
+def get_schema_view():
+    from drf_yasg.views import get_schema_view as build_schema_view
+    from rest_framework import permissions
+    from rest_framework_simplejwt.authentication import JWTAuthentication
+
+    return build_schema_view(
+        get_api_info(),
+        public=True,
+        permission_classes=[permissions.AllowAny, ],
+        authentication_classes=[JWTAuthentication],
+    )
+
+
+@lru_cache(maxsize=None)
+def get_ui_view(renderer):
+    return get_schema_view().with_ui(renderer, cache_timeout=settings.API_SCHEMA_CACHE_TIMEOUT)
+
+
+def generate_schema():
+    """
+    Генерация схемы OpenAPI в JSON
+    """
+    from drf_yasg.codecs import OpenAPICodecJson
+    from drf_yasg.generators import OpenAPISchemaGenerator
+
+    schema = OpenAPISchemaGenerator(get_api_info()).get_schema(request=None, public=True)
+    return OpenAPICodecJson(validators=[]).encode(schema)
+
+
+def write_schema(path):
+    """
+    Сохранение схемы и ее сжатой копии <path>.gz
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    content = generate_schema()
+    path.write_bytes(content)
+    Path(f'{path}.gz').write_bytes(gzip.compress(content, mtime=0))
+    load_schema_file.cache_clear()
+    return content
+
+
+@lru_cache(maxsize=None)
+def load_schema_file(path):
+    """
+    Загрузка заранее сгенерированной схемы в память. Возвращает (json, gzip) или None, если файла нет.
+    """
+    path = Path(path)
+    if not path.exists():
+        return None
+    gz_path = Path(f'{path}.gz')
+    content = path.read_bytes()
+    compressed = gz_path.read_bytes() if gz_path.exists() else gzip.compress(content, mtime=0)
+    return content, compressed
+
+
+def schema_file_response(request):
+    schema = load_schema_file(settings.API_SCHEMA_FILE)
+    if schema is None:
+        return None
+    content, compressed = schema
+    if 'gzip' in request.headers.get('Accept-Encoding', ''):
+        response = HttpResponse(compressed, content_type='application/json')
+        response['Content-Encoding'] = 'gzip'
+    else:
+        response = HttpResponse(content, content_type='application/json')
+    patch_vary_headers(response, ['Accept-Encoding'])
+    patch_cache_control(response, public=True, max_age=settings.API_SCHEMA_CACHE_TIMEOUT)
+    return response
+
+
+@require_GET
+def schema_json(request):
+    """
+    Схема OpenAPI: готовый файл, либо генерация на лету, если файл не создан
+    """
+    response = schema_file_response(request)
+    if response is None:
+        response = get_schema_view().without_ui(cache_timeout=settings.API_SCHEMA_CACHE_TIMEOUT)(request)
+    return response
+
+
+@require_GET
+def schema_ui(request, renderer):
+    """
+    Страница swagger/redoc. Сама страница запрашивает схему по тому же адресу с ?format=openapi
+    """
+    if request.GET.get('format') == 'openapi':
+        response = schema_file_response(request)
+        if response is not None:
+            return response
+    return get_ui_view(renderer)(request)
@@ -0,0 +1,250 @@
+"""
+Профилирование отдельных запросов по требованию.
+
+Профиль снимается, если администратор передал заголовок X-Profile или параметр ?profile=
+(значения cprofile или sampling), либо случайно с вероятностью PROFILING_SAMPLE_RATE.
+Вместе с профилем сохраняется журнал SQL-запросов. При PROFILING_ENABLED = False
+middleware исключается из цепочки и не добавляет накладных расходов.
+"""
+import cProfile
+import json
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from contextlib import ExitStack
+from datetime import datetime
+from pathlib import Path
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.http import FileResponse, Http404
+from rest_framework import permissions
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken, AuthenticationFailed
+
+
+PROFILING_MODES = ('cprofile', 'sampling')
+
+PROFILE_EXTENSIONS = {
+    'cprofile': '.prof',
+    'sampling': '.speedscope.json',
+}
+
+PROFILE_NAME_RE = re.compile(r'^(?P<id>[0-9]{20}-[0-9a-f]{8})(\.prof|\.speedscope\.json|\.sql\.json)$')
+
+
+def get_profiles_dir():
+    return Path(settings.PROFILING_DIR)
+
+
+class QueryLogger:
+    """
+    Обертка выполнения запросов (connection.execute_wrapper), собирающая SQL и время выполнения
+    """
+
+    def __init__(self, alias):
+        self.alias = alias
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append({
+                'alias': self.alias,
+                'sql': sql,
+                'params': repr(params),
+                'many': many,
+                'duration': time.perf_counter() - started,
+            })
+
+
+class StackSampler:
+    """
+    Сэмплирующий профилировщик: фоновый поток периодически снимает стек потока запроса.
+    Результат сохраняется в формате speedscope.
+    """
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.thread_id = threading.get_ident()
+        self.frames = []
+        self.frame_index = {}
+        self.samples = []
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def start(self):
+        self.started = time.perf_counter()
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+        self.duration = time.perf_counter() - self.started
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.samples.append(self.collect(frame))
+
+    def collect(self, frame):
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            key = (code.co_name, code.co_filename, code.co_firstlineno)
+            index = self.frame_index.get(key)
+            if index is None:
+                index = self.frame_index[key] = len(self.frames)
+                self.frames.append({'name': key[0], 'file': key[1], 'line': key[2]})
+            stack.append(index)
+            frame = frame.f_back
+        stack.reverse()
+        return stack
+
+    def to_speedscope(self, name):
+        return {
+            '$schema': 'https://www.speedscope.app/file-format-schema.json',
+            'shared': {'frames': self.frames},
+            'profiles': [{
+                'type': 'sampled',
+                'name': name,
+                'unit': 'seconds',
+                'startValue': 0,
+                'endValue': self.duration,
+                'samples': self.samples,
+                'weights': [self.interval] * len(self.samples),
+            }],
+            'name': name,
+            'exporter': 'smarteducation',
+        }
+
+
+class ProfilingMiddleware:
+    """
+    Снятие профиля и журнала SQL для отдельных запросов
+    """
+
+    def __init__(self, get_response):
+        if not settings.PROFILING_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.jwt_authentication = JWTAuthentication()
+
+    def __call__(self, request):
+        mode = self.get_mode(request)
+        if mode is None:
+            return self.get_response(request)
+        return self.profile(request, mode)
+
+    def get_mode(self, request):
+        requested = request.headers.get('X-Profile') or request.GET.get('profile')
+        if requested:
+            if not self.is_staff(request):
+                return None
+            return requested if requested in PROFILING_MODES else settings.PROFILING_MODE
+        if settings.PROFILING_SAMPLE_RATE and random.random() < settings.PROFILING_SAMPLE_RATE:
+            return settings.PROFILING_MODE
+        return None
+
+    def is_staff(self, request):
+        # JWT проверяется только в DRF-представлении, поэтому пользователя определяем здесь сами
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_authenticated:
+            return user.is_staff
+        try:
+            result = self.jwt_authentication.authenticate(request)
+        except (InvalidToken, AuthenticationFailed):
+            return False
+        return result is not None and result[0].is_staff
+
+    def profile(self, request, mode):
+        # Идентификатор начинается с времени с точностью до микросекунд, поэтому сортируется по времени
+        profile_id = f'{datetime.now().strftime("%Y%m%d%H%M%S%f")}-{uuid.uuid4().hex[:8]}'
+        loggers = [QueryLogger(connection.alias) for connection in connections.all()]
+        with ExitStack() as stack:
+            for connection, logger in zip(connections.all(), loggers):
+                stack.enter_context(connection.execute_wrapper(logger))
+            if mode == 'sampling':
+                profiler = StackSampler(settings.PROFILING_SAMPLING_INTERVAL)
+                profiler.start()
+                try:
+                    response = self.get_response(request)
+                finally:
+                    profiler.stop()
+            else:
+                profiler = cProfile.Profile()
+                profiler.enable()
+                try:
+                    response = self.get_response(request)
+                finally:
+                    profiler.disable()
+
+        self.save(profile_id, mode, profiler, request, loggers)
+        response['X-Profile-Id'] = profile_id
+        return response
+
+    def save(self, profile_id, mode, profiler, request, loggers):
+        directory = get_profiles_dir()
+        directory.mkdir(parents=True, exist_ok=True)
+        name = f'{request.method} {request.path}'
+        profile_path = directory / f'{profile_id}{PROFILE_EXTENSIONS[mode]}'
+        if mode == 'sampling':
+            profile_path.write_text(json.dumps(profiler.to_speedscope(name)))
+        else:
+            profiler.dump_stats(profile_path)
+        queries = [query for logger in loggers for query in logger.queries]
+        (directory / f'{profile_id}.sql.json').write_text(json.dumps({
+            'request': name,
+            'count': len(queries),
+            'duration': sum(query['duration'] for query in queries),
+            'queries': queries,
+        }, indent=2))
+        cleanup_profiles(directory, settings.PROFILING_MAX_PROFILES)
+
+
+def cleanup_profiles(directory, max_profiles):
+    """
+    Удаление самых старых профилей сверх лимита хранения
+    """
+    matches = (PROFILE_NAME_RE.match(path.name) for path in directory.iterdir())
+    profile_ids = sorted({match.group('id') for match in matches if match})
+    for profile_id in profile_ids[:max(len(profile_ids) - max_profiles, 0)]:
+        for path in directory.glob(f'{profile_id}.*'):
+            path.unlink(missing_ok=True)
+
+
+class ProfileListView(APIView):
+    """
+    Список сохраненных профилей
+    """
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        directory = get_profiles_dir()
+        if not directory.exists():
+            return Response([])
+        names = sorted((path.name for path in directory.iterdir() if PROFILE_NAME_RE.match(path.name)),
+                       reverse=True)
+        return Response(names)
+
+
+class ProfileDownloadView(APIView):
+    """
+    Скачивание файла профиля (pstats, speedscope или журнал SQL)
+    """
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request, name):
+        path = get_profiles_dir() / name
+        if not PROFILE_NAME_RE.match(name) or not path.exists():
+            raise Http404
+        return FileResponse(open(path, 'rb'), as_attachment=True, filename=name)
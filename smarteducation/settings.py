@@ -40,12 +40,18 @@ INSTALLED_APPS = [
     'rest_framework',
     'rest_framework_simplejwt',
     'django_filters',
-    'drf_yasg',
     'apps.tasks',
     'apps.users',
 ]
 
+# Документация API /swagger/ и /redoc/, по умолчанию включена только в режиме отладки
+API_DOCS_ENABLED = os.environ.get('API_DOCS_ENABLED', '1' if DEBUG else '0') == '1'
+
+if API_DOCS_ENABLED:
+    INSTALLED_APPS.append('drf_yasg')
+
 MIDDLEWARE = [
+    'smarteducation.profiling.ProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -151,6 +157,10 @@ SIMPLE_JWT = {
     'AUTH_HEADER_TYPES': ('Bearer',),
 }
 
+# Заранее сгенерированная схема OpenAPI (python manage.py generate_schema)
+API_SCHEMA_FILE = os.path.join(BASE_DIR, 'openapi', 'openapi.json')
+API_SCHEMA_CACHE_TIMEOUT = 60 * 60
+
 SWAGGER_SETTINGS = {
     'SECURITY_DEFINITIONS': {
         'Bearer': {
@@ -161,3 +171,50 @@ SWAGGER_SETTINGS = {
         }
     },
 }
+
+# Архивирование выполненных задач
+TASK_ARCHIVE_AFTER_DAYS = 30
+TASK_ARCHIVE_BATCH_SIZE = 500
+
+# Размер пачки серверного курсора при выгрузке задач
+TASK_EXPORT_CHUNK_SIZE = 2000
+
+# Количество задач в одной транзакции при импорте
+TASK_IMPORT_BATCH_SIZE = 1000
+# Максимальный размер поля CSV при импорте, стандартный лимит модуля csv - 128 КБ
+TASK_IMPORT_CSV_FIELD_SIZE_LIMIT = 16 * 1024 * 1024
+
+# Профилирование запросов по заголовку X-Profile (только для администраторов) или по выборке
+PROFILING_ENABLED = os.environ.get('PROFILING_ENABLED', '') == '1'
+PROFILING_SAMPLE_RATE = float(os.environ.get('PROFILING_SAMPLE_RATE', '0'))
+PROFILING_MODE = 'cprofile'
+PROFILING_SAMPLING_INTERVAL = 0.005
+PROFILING_DIR = os.path.join(BASE_DIR, 'profiles')
+PROFILING_MAX_PROFILES = 50
+
+# Планировщик дедлайнов: напоминание за TASK_REMINDER_BEFORE до дедлайна и событие о просрочке
+TASK_REMINDER_BEFORE = timedelta(hours=24)
+TASK_SCHEDULER_WINDOW = timedelta(hours=1)
+TASK_SCHEDULER_POLL_INTERVAL = timedelta(minutes=1)
+TASK_SCHEDULER_BATCH_SIZE = 500
+
+# Ответы на комментарии: максимальная глубина и количество веток верхнего уровня на странице
+COMMENT_MAX_DEPTH = 10
+COMMENT_THREADS_PAGE_SIZE = 20
+COMMENT_THREADS_MAX_PAGE_SIZE = 100
+
+# Максимальное количество задач в запросе /tasks/?ids=
+TASK_MULTI_GET_MAX_IDS = 100
+
+# Журнал активности: события копятся в памяти процесса и записываются пачкой,
+# когда их набирается ACTIVITY_FLUSH_SIZE или самое старое ждет дольше ACTIVITY_FLUSH_INTERVAL секунд
+ACTIVITY_FLUSH_SIZE = 100
+ACTIVITY_FLUSH_INTERVAL = 5
+# Фоновый поток, записывающий события по истечении ACTIVITY_FLUSH_INTERVAL без новых запросов
+ACTIVITY_FLUSH_TIMER = os.environ.get('ACTIVITY_FLUSH_TIMER', '1') == '1'
+ACTIVITY_PAGE_SIZE = 50
+ACTIVITY_MAX_PAGE_SIZE = 200
+
+# Статистика /tasks/stats/: период по умолчанию в днях и размер пачки при полном пересчете агрегатов
+TASK_STATS_DEFAULT_DAYS = 30
+TASK_STATS_BATCH_SIZE = 2000
@@ -14,47 +14,42 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
-from drf_yasg.views import get_schema_view
-from drf_yasg import openapi
-from rest_framework_simplejwt.authentication import JWTAuthentication
-
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 
-from rest_framework import permissions
 from rest_framework.routers import DefaultRouter
 
+from django.conf import settings
 from django.contrib import admin
 from django.urls import path, include
 
 from apps.tasks.views import TaskViewSet, CommentViewSet
 from apps.users.views import RegisterView
+from smarteducation.profiling import ProfileListView, ProfileDownloadView
 
 router = DefaultRouter()
 router.register(r'tasks', TaskViewSet, basename='task')
 router.register(r'comments', CommentViewSet, basename='comment')
 
-schema_view = get_schema_view(
-    openapi.Info(
-        title="Task Management API",
-        default_version='v1',
-        description="API для системы управления задачами",
-        contact=openapi.Contact(email="support@example.com"),
-        license=openapi.License(name="BSD License"),
-    ),
-    public=True,
-    permission_classes=[permissions.AllowAny, ],
-    authentication_classes=[JWTAuthentication],
-)
-
-
 urlpatterns = [
     path('admin/', admin.site.urls),
-    path('swagger/', schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),
-    path('redoc/', schema_view.with_ui('redoc', cache_timeout=0), name='schema-redoc'),
     path('signup/', RegisterView.as_view(), name='register'),
     path('', include(router.urls)),
 
     # Маршруты для аутентификации через JWT
     path('token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
     path('token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
+
+    # Сохраненные профили запросов
+    path('profiles/', ProfileListView.as_view(), name='profile-list'),
+    path('profiles/<str:name>', ProfileDownloadView.as_view(), name='profile-download'),
 ]
+
+# Документация API подключается только если включена, drf_yasg загружается при первом обращении
+if settings.API_DOCS_ENABLED:
+    from smarteducation import docs
+
+    urlpatterns += [
+        path('swagger.json', docs.schema_json, name='schema-json'),
+        path('swagger/', docs.schema_ui, {'renderer': 'swagger'}, name='schema-swagger-ui'),
+        path('redoc/', docs.schema_ui, {'renderer': 'redoc'}, name='schema-redoc'),
+    ]
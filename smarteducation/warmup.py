@@ -0,0 +1,118 @@
+"""
+Прогрев приложения до запуска воркеров.
+
+При запуске gunicorn с preload_app приложение загружается в главном процессе, после чего
+воркеры создаются через fork и получают уже построенные резолвер URL, импортированные классы
+DRF и заполненные кеши метаданных моделей. Страницы памяти с этими данными остаются общими
+(copy-on-write), а первые запросы после деплоя не тратят время на ленивую инициализацию.
+Соединения с базой данных закрываются перед fork, каждый воркер открывает свои.
+"""
+import gc
+import logging
+import os
+import time
+
+from django.db import DatabaseError, connections
+from django.urls import URLPattern, URLResolver, get_resolver
+
+
+logger = logging.getLogger(__name__)
+
+
+def is_enabled():
+    return os.environ.get('DJANGO_WARMUP', '0') == '1'
+
+
+def iter_views(patterns):
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            yield from iter_views(pattern.url_patterns)
+        elif isinstance(pattern, URLPattern):
+            yield pattern.callback
+
+
+def warm_urls():
+    """
+    Импорт всех модулей urls и представлений, построение таблиц reverse() резолвера
+    """
+    resolver = get_resolver()
+    resolver.reverse_dict
+    return list(iter_views(resolver.url_patterns))
+
+
+def warm_api_settings():
+    """
+    Импорт классов из настроек DRF: рендереры, парсеры, аутентификация, права доступа и т.д.
+    """
+    from rest_framework.settings import api_settings
+
+    for name in api_settings.import_strings:
+        getattr(api_settings, name)
+
+
+def warm_serializers(callbacks):
+    """
+    Построение полей сериализаторов всех представлений DRF и всех действий ViewSet.
+    Заполняет кеши метаданных моделей (_meta), которые ModelSerializer читает при каждом создании полей.
+    """
+    warmed = set()
+    for callback in callbacks:
+        view_class = getattr(callback, 'cls', None)
+        if view_class is None or not hasattr(view_class, 'get_serializer_class'):
+            continue
+        actions = getattr(callback, 'actions', None) or {}
+        for action in set(actions.values()) or {None}:
+            view = view_class(**getattr(callback, 'initkwargs', {}))
+            view.action = action
+            view.request = None
+            view.format_kwarg = None
+            try:
+                serializer_class = view.get_serializer_class()
+            except Exception:
+                continue  # представление без сериализатора или зависящее от запроса
+            if serializer_class in warmed:
+                continue
+            warmed.add(serializer_class)
+            try:
+                serializer_class(context={}).fields
+            except Exception:
+                logger.warning('Failed to warm up %s', serializer_class.__name__, exc_info=True)
+    return len(warmed)
+
+
+def warm_database():
+    """
+    Загрузка модулей бэкендов и компилятора запросов пробным запросом, затем закрытие соединений,
+    чтобы дочерние процессы не делили один сокет или файл базы
+    """
+    from apps.tasks.models import Task
+
+    try:
+        Task.objects.filter(pk=0).exists()
+    except DatabaseError as exc:
+        logger.warning('Database is not available during warm-up: %s', exc)
+    finally:
+        connections.close_all()
+
+
+def warm_up():
+    """
+    Полный прогрев. Возвращает длительность каждого шага в секундах.
+    """
+    timings = {}
+    started = time.perf_counter()
+    callbacks = warm_urls()
+    timings['urls'] = time.perf_counter() - started
+    for name, step in (('api_settings', warm_api_settings),
+                       ('serializers', lambda: warm_serializers(callbacks)),
+                       ('database', warm_database)):
+        step_started = time.perf_counter()
+        step()
+        timings[name] = time.perf_counter() - step_started
+    # Объекты, созданные до fork, переносятся в постоянное поколение: сборщик мусора воркера
+    # не будет их обходить и не изменит общие страницы памяти
+    gc.collect()
+    gc.freeze()
+    timings['total'] = time.perf_counter() - started
+    logger.info('Application warmed up in %.3fs', timings['total'])
+    return timings